@@ -0,0 +1,272 @@
+"""Threshold / signal alerts evaluated on every intraday snapshot.
+
+Rules come from config.yaml `alerts.rules` and are compiled once into
+arrays: every per-pair rule becomes a row of (feature, threshold, sign),
+every correlation rule a row over all pair crosses. A snapshot is then a
+single comparison of the feature matrix against the threshold matrix.
+
+Daily-derived state (prev fixing, Wilder RSI averages, RV ratios,
+correlation breaks) is rebuilt only when daily.csv / volatility.csv change,
+so the per-tick cost is a handful of vector ops regardless of history size.
+
+Rule types:
+    pips        |Δ pips vs prev fixing| >= above
+    pct         |%Δ vs prev fixing|     >= above
+    rsi_above   live RSI >= level
+    rsi_below   live RSI <= level
+    rv_regime   rv_<short> / rv_<long>  >= ratio
+    corr_break  |corr_<short>d - corr_<long>d| >= delta   (per pair cross)
+"""
+import json
+import socket
+import time
+from datetime import datetime
+
+import numpy as np
+
+import main as backend
+
+ALERT_PATH = backend.DATA_DIR / "alerts.log"
+
+# rule type → (feature name template, abs value?, sign, threshold key)
+_RULE_TYPES = {
+    "pips": ("pips", True, 1.0, "above"),
+    "pct": ("pct", True, 1.0, "above"),
+    "rsi_above": ("rsi", False, 1.0, "level"),
+    "rsi_below": ("rsi", False, -1.0, "level"),
+    "rv_regime": ("rv:{short}/{long}", False, 1.0, "ratio"),
+    "corr_break": ("corr:{short}/{long}", False, 1.0, "delta"),
+}
+
+_DEFAULT_PARAMS = {
+    "rv_regime": {"short": 30, "long": 250},
+    "corr_break": {"short": 30, "long": 250},
+}
+
+
+class _CompiledRules:
+    """K rules × M subjects: feature row, threshold, sign, abs flag + fire state."""
+
+    def __init__(self, rules, feature_names, subjects, masks):
+        self.names = [r["name"] for r in rules]
+        self.types = [r["type"] for r in rules]
+        self.subjects = subjects
+        self.feature_names = feature_names
+        self.feat_idx = np.array([feature_names.index(r["_feature"]) for r in rules], dtype=np.intp)
+        self.sign = np.array([r["_sign"] for r in rules], dtype=np.float64)[:, None]
+        self.use_abs = np.array([r["_abs"] for r in rules], dtype=bool)[:, None]
+
+        thr = np.array([r["_threshold"] for r in rules], dtype=np.float64)[:, None]
+        self.thr = np.where(masks, thr, np.nan) if len(rules) else np.empty((0, len(subjects)))
+
+        shape = (len(rules), len(subjects))
+        self.active = np.zeros(shape, dtype=bool)
+        self.last_fired = np.full(shape, -np.inf)
+
+    def evaluate(self, features: np.ndarray, now: float, cooldown: float):
+        """Indices (k, m) of rules that newly fire, and the feature values."""
+        if not self.names:
+            return [], None
+
+        X = features[self.feat_idx]                       # K × M
+        X = np.where(self.use_abs, np.abs(X), X)
+        with np.errstate(invalid="ignore"):
+            hits = self.sign * X >= self.sign * self.thr  # NaN → False
+
+        # 边沿触发 + cool-down：条件持续为真时不重复报
+        fire = hits & ~self.active & (now - self.last_fired >= cooldown)
+        self.active = hits
+        self.last_fired[fire] = now
+        return list(zip(*np.nonzero(fire))), X
+
+
+class AlertEngine:
+    def __init__(self, cfg=None, logger=None):
+        cfg = cfg or backend.load_config()
+        self.logger = logger
+        self.pair_names, _ = backend._get_pairs_and_symbols(cfg)
+        n = len(self.pair_names)
+
+        alert_cfg = cfg.get("alerts") or {}
+        self.cooldown = float(alert_cfg.get("cooldown", 300))
+        self.rsi_window = int(alert_cfg.get("rsi_window", 14))
+        self.path = backend.BASE_DIR / alert_cfg["file"] if alert_cfg.get("file") else ALERT_PATH
+
+        self._udp = None
+        if alert_cfg.get("udp"):
+            host, port = str(alert_cfg["udp"]).rsplit(":", 1)
+            self._udp_addr = (host, int(port))
+            self._udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        iu, ju = np.triu_indices(n, k=1)
+        self._cross_idx = (iu, ju)
+        self.cross_names = [f"{self.pair_names[i]}/{self.pair_names[j]}" for i, j in zip(iu, ju)]
+
+        pair_rules, cross_rules = [], []
+        for i, rule in enumerate(alert_cfg.get("rules") or []):
+            rule = self._normalize(rule, i)
+            (cross_rules if rule["type"] == "corr_break" else pair_rules).append(rule)
+
+        self.pair_features = ["pips", "pct", "rsi"] + sorted(
+            {r["_feature"] for r in pair_rules if r["_feature"].startswith("rv:")}
+        )
+        self.cross_features = sorted({r["_feature"] for r in cross_rules})
+
+        self.pair_rules = _CompiledRules(
+            pair_rules, self.pair_features, self.pair_names,
+            np.array([self._pair_mask(r) for r in pair_rules]).reshape(len(pair_rules), n),
+        )
+        self.cross_rules = _CompiledRules(
+            cross_rules, self.cross_features, self.cross_names,
+            np.ones((len(cross_rules), len(self.cross_names)), dtype=bool),
+        )
+
+        self._stamp = None
+        self._refresh_state()
+
+    # ---------- compile ----------
+    @staticmethod
+    def _normalize(rule: dict, i: int) -> dict:
+        kind = rule.get("type")
+        if kind not in _RULE_TYPES:
+            raise ValueError(f"Unknown alert rule type: {kind}")
+        template, use_abs, sign, thr_key = _RULE_TYPES[kind]
+        if thr_key not in rule:
+            raise ValueError(f"Alert rule '{rule.get('name', kind)}' needs '{thr_key}'.")
+
+        params = dict(_DEFAULT_PARAMS.get(kind, {}))
+        params.update({k: rule[k] for k in ("short", "long") if k in rule})
+
+        out = dict(rule)
+        out.setdefault("name", f"{kind}_{i}")
+        out["_feature"] = template.format(**params)
+        out["_abs"] = use_abs
+        out["_sign"] = sign
+        out["_threshold"] = float(rule[thr_key])
+        return out
+
+    def _pair_mask(self, rule) -> list:
+        only = rule.get("pairs")
+        return [only is None or p in only for p in self.pair_names]
+
+    # ---------- daily-derived state ----------
+    def _refresh_state(self):
+        stamp = tuple(
+            tuple(backend._source_stamp(p)) if p.exists() else None
+            for p in (backend.DAILY_PATH, backend.VOL_PATH)
+        )
+        if stamp == self._stamp:
+            return
+        self._stamp = stamp
+
+        n = len(self.pair_names)
+        nan = np.full(n, np.nan)
+        self.prev_fix = nan.copy()
+        self.last_close = nan.copy()
+        self.avg_gain = nan.copy()
+        self.avg_loss = nan.copy()
+        self.pip_mult = np.array([backend.compute_pips(p, 1.0) for p in self.pair_names])
+        self.rv_feats = {}
+        self.cross_feats = np.full((len(self.cross_features), len(self.cross_names)), np.nan)
+
+        longest = max([500] + [int(f.split("/")[1]) + 1 for f in self.cross_features])
+        px = backend.get_history(self.pair_names, last=longest)
+        if px is not None and len(px):
+            px = px.reindex(columns=self.pair_names)
+            # 跟 dashboard 一样：和昨天 fixing 比
+            self.prev_fix = px.iloc[-2 if len(px) >= 2 else -1].to_numpy(np.float64)
+
+            # Wilder RSI 状态，live tick 当作下一根 bar
+            closes = px.ffill()
+            delta = closes.diff()
+            a = 1 / self.rsi_window
+            self.avg_gain = delta.clip(lower=0).ewm(alpha=a, adjust=False).mean().iloc[-1].to_numpy()
+            self.avg_loss = (-delta.clip(upper=0)).ewm(alpha=a, adjust=False).mean().iloc[-1].to_numpy()
+            self.last_close = closes.iloc[-1].to_numpy(np.float64)
+
+            rets = backend.compute_log_returns(px)
+            iu, ju = self._cross_idx
+            for fi, feat in enumerate(self.cross_features):
+                short, long = (int(x) for x in feat.split(":")[1].split("/"))
+                c_s = rets.tail(short).corr().to_numpy()
+                c_l = rets.tail(long).corr().to_numpy()
+                self.cross_feats[fi] = np.abs(c_s - c_l)[iu, ju]
+
+        for feat in self.pair_features:
+            if not feat.startswith("rv:"):
+                continue
+            short, long = feat.split(":")[1].split("/")
+            vol = backend.get_history(self.pair_names, fields=[f"rv_{short}", f"rv_{long}"], last=1)
+            ratio = nan.copy()
+            have = set(vol.columns.get_level_values("field")) if vol is not None else set()
+            if have >= {f"rv_{short}", f"rv_{long}"} and len(vol):
+                s = vol[f"rv_{short}"].reindex(columns=self.pair_names).iloc[-1].to_numpy(np.float64)
+                l = vol[f"rv_{long}"].reindex(columns=self.pair_names).iloc[-1].to_numpy(np.float64)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    ratio = s / l
+            self.rv_feats[feat] = ratio
+
+    # ---------- per tick ----------
+    def _pair_feature_matrix(self, prices: np.ndarray) -> np.ndarray:
+        F = np.empty((len(self.pair_features), len(self.pair_names)))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = prices - self.prev_fix
+            F[0] = change * self.pip_mult
+            F[1] = change / self.prev_fix * 100
+
+            delta = prices - self.last_close
+            a = 1 / self.rsi_window
+            gain = (1 - a) * self.avg_gain + a * np.maximum(delta, 0)
+            loss = (1 - a) * self.avg_loss + a * np.maximum(-delta, 0)
+            F[2] = 100 - 100 / (1 + gain / loss)
+
+        for fi, feat in enumerate(self.pair_features[3:], start=3):
+            F[fi] = self.rv_feats[feat]
+        return F
+
+    def evaluate(self, ticks: dict, now=None) -> list:
+        """Check one snapshot {pair: price}; emit and return newly fired alerts."""
+        now = time.time() if now is None else now
+        self._refresh_state()
+
+        prices = np.array([ticks.get(p, np.nan) for p in self.pair_names], dtype=np.float64)
+
+        fired = []
+        for rules, features in (
+            (self.pair_rules, self._pair_feature_matrix(prices)),
+            (self.cross_rules, self.cross_feats),
+        ):
+            hits, X = rules.evaluate(features, now, self.cooldown)
+            for k, m in hits:
+                fired.append({
+                    "ts": datetime.utcfromtimestamp(now).isoformat(timespec="seconds"),
+                    "rule": rules.names[k],
+                    "type": rules.types[k],
+                    "subject": rules.subjects[m],
+                    "value": float(X[k, m]),
+                    "threshold": float(rules.thr[k, m]),
+                })
+
+        if fired:
+            self._emit(fired)
+        return fired
+
+    # ---------- sinks ----------
+    def _emit(self, fired: list):
+        lines = [json.dumps(a) for a in fired]
+        for a in fired:
+            backend._log(
+                f"ALERT {a['rule']} {a['subject']}: {a['value']:.4g} (threshold {a['threshold']:g})",
+                self.logger,
+            )
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+        if self._udp is not None:
+            for line in lines:
+                try:
+                    self._udp.sendto(line.encode("utf-8"), self._udp_addr)
+                except OSError as e:
+                    backend._log(f"Alert socket send failed: {e}", self.logger)
@@ -0,0 +1,220 @@
+"""Chart drawing shared by the GUI and the headless report export.
+
+The `draw_*` functions only take axes, so the GUI draws into pyplot
+figures (and calls `plt.show()`), while `export_reports` draws into plain
+`matplotlib.figure.Figure` objects on the Agg backend inside a process pool.
+
+    python main.py --action export --format png --workers 8
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import matplotlib
+from matplotlib.figure import Figure
+import seaborn as sns
+
+import main as backend
+
+RV_SHORT = ["rv_30", "rv_60", "rv_90"]
+RV_ALL = ["rv_30", "rv_60", "rv_90", "rv_180", "rv_250"]
+
+REPORT_DIR = backend.DATA_DIR / "reports"
+
+
+# =========================================
+#   Technical Indicators
+# =========================================
+def compute_bollinger(px, window=20, num_std=2):
+    ma = px.rolling(window).mean()
+    std = px.rolling(window).std()
+    lower = ma - num_std * std
+    upper = ma + num_std * std
+    return ma, upper, lower
+
+
+def compute_macd(px, fast=12, slow=26, signal=9):
+    ema_fast = px.ewm(span=fast, adjust=False).mean()
+    ema_slow = px.ewm(span=slow, adjust=False).mean()
+    macd = ema_fast - ema_slow
+    signal_line = macd.ewm(span=signal, adjust=False).mean()
+    hist = macd - signal_line
+    return macd, signal_line, hist
+
+
+def compute_rsi(px, window=14):
+    # Wilder's RSI
+    delta = px.diff()
+    gain = delta.clip(lower=0)
+    loss = -delta.clip(upper=0)
+
+    avg_gain = gain.ewm(alpha=1/window, adjust=False).mean()
+    avg_loss = loss.ewm(alpha=1/window, adjust=False).mean()
+
+    rs = avg_gain / avg_loss
+    rsi = 100 - (100 / (1 + rs))
+    return rsi
+
+
+def rv_frame(pair, cols, index=None):
+    """Date-indexed RV columns for one pair from the history index, or None."""
+    df = backend.get_history([pair], fields=cols)
+    if df is None or pair not in df.columns.get_level_values("pair"):
+        return None
+    rv = df.xs(pair, axis=1, level="pair")
+    if index is not None:
+        rv = rv.reindex(index)
+    return rv
+
+
+# =========================================
+#   Drawing
+# =========================================
+def draw_history(axes, pair, px, rv_sub=None):
+    """Price/MA/Bollinger, RV, MACD and RSI onto four stacked axes."""
+    ax_price, ax_rv, ax_macd, ax_rsi = axes
+
+    ma20, bb_up, bb_low = compute_bollinger(px, window=20, num_std=2)
+    ma60 = px.rolling(60).mean()
+    macd, macd_sig, macd_hist = compute_macd(px)
+    rsi = compute_rsi(px)
+
+    # 1) Price + MA + Bollinger
+    ax_price.plot(px.index, px.values, label=f"{pair} Price", linewidth=1.2)
+    ax_price.plot(ma20.index, ma20.values, "--", label="MA20")
+    ax_price.plot(ma60.index, ma60.values, ":", label="MA60")
+
+    ax_price.fill_between(px.index, bb_low, bb_up, color="lightgray", alpha=0.4, label="Bollinger(20,2)")
+    ax_price.set_ylabel("Price")
+    ax_price.set_title(f"{pair} – Price, MA & Bollinger")
+    ax_price.grid(True)
+    ax_price.legend(loc="upper left")
+
+    # 2) Realized Vol
+    if rv_sub is not None:
+        for c in rv_sub.columns:
+            ax_rv.plot(rv_sub.index, rv_sub[c], label=c)
+        ax_rv.set_ylabel("Realized Vol")
+        ax_rv.set_title("Realized Volatility (RV_30 / RV_60 / RV_90)")
+        ax_rv.legend(loc="upper left")
+    else:
+        ax_rv.text(0.5, 0.5, "No RV data", ha="center", va="center", transform=ax_rv.transAxes)
+        ax_rv.set_title("Realized Volatility")
+    ax_rv.grid(True)
+
+    # 3) MACD
+    ax_macd.plot(macd.index, macd.values, label="MACD", linewidth=1.0)
+    ax_macd.plot(macd_sig.index, macd_sig.values, label="Signal", linewidth=1.0)
+    ax_macd.bar(macd_hist.index, macd_hist.values, label="Hist", alpha=0.4)
+    ax_macd.axhline(0, color="black", linewidth=0.8)
+    ax_macd.set_ylabel("MACD")
+    ax_macd.set_title("MACD (12,26,9)")
+    ax_macd.legend(loc="upper left")
+    ax_macd.grid(True)
+
+    # 4) RSI
+    ax_rsi.plot(rsi.index, rsi.values, label="RSI(14)", linewidth=1.0)
+    ax_rsi.axhline(70, color="red", linestyle="--", linewidth=0.8)
+    ax_rsi.axhline(30, color="green", linestyle="--", linewidth=0.8)
+    ax_rsi.set_ylabel("RSI")
+    ax_rsi.set_title("RSI (14)")
+    ax_rsi.set_ylim(0, 100)
+    ax_rsi.grid(True)
+    ax_rsi.legend(loc="upper left")
+
+
+def draw_vol_surface(ax, pair, df_surf):
+    df_surf = df_surf.copy()
+    df_surf.index = df_surf.index.strftime("%Y%m%d")
+    sns.heatmap(df_surf.T, cmap="coolwarm", ax=ax)
+    ax.set_title(f"{pair} – Realized Volatility Surface")
+    ax.set_xlabel("Date")
+    ax.tick_params(axis="x", labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_ha("right")
+    ax.set_ylabel("Window")
+
+
+def draw_corr_heatmap(ax, corr):
+    sns.heatmap(corr, cmap="coolwarm", square=True, annot=True,
+                linewidths=0.4, ax=ax)
+    ax.set_title("Correlation Heatmap (Daily Log Returns)")
+
+
+# =========================================
+#   Headless export (process pool)
+# =========================================
+# 数据不 pickle 给 worker：父进程先把 history index 建好，
+# worker 通过 get_history mmap 读同一份文件（OS page cache 共享）
+def _init_worker():
+    matplotlib.use("Agg")
+
+
+def _save(fig, out_dir: Path, name: str, fmt: str) -> str:
+    path = out_dir / f"{name}.{fmt}"
+    fig.tight_layout()
+    fig.savefig(path, format=fmt, dpi=110)
+    return str(path)
+
+
+def _render_pair(pair: str, out_dir: Path, fmt: str) -> list:
+    out = []
+
+    daily = backend.get_history([pair])
+    px = daily[pair].dropna() if daily is not None and pair in daily.columns else None
+    if px is not None and not px.empty:
+        rv = rv_frame(pair, RV_SHORT, index=px.index)
+
+        fig = Figure(figsize=(13, 10))
+        axes = fig.subplots(4, 1, sharex=True)
+        draw_history(axes, pair, px, rv)
+        out.append(_save(fig, out_dir, f"{pair}_history", fmt))
+
+    surf = rv_frame(pair, RV_ALL)
+    if surf is not None and not surf.dropna(how="all").empty:
+        fig = Figure(figsize=(10, 6))
+        draw_vol_surface(fig.subplots(), pair, surf)
+        out.append(_save(fig, out_dir, f"{pair}_vol_surface", fmt))
+
+    return out
+
+
+def _render_corr(pair_names: list, out_dir: Path, fmt: str) -> list:
+    rets = backend.compute_log_returns(backend.get_history(pair_names))
+    if rets.empty:
+        return []
+    fig = Figure(figsize=(11, 9))
+    draw_corr_heatmap(fig.subplots(), rets.corr())
+    return [_save(fig, out_dir, "correlation_heatmap", fmt)]
+
+
+def export_reports(out_dir=None, fmt="png", workers=None, logger=None) -> list:
+    """Render every configured pair's charts + the correlation heatmap to files."""
+    cfg = backend.load_config()
+    pair_names, _ = backend._get_pairs_and_symbols(cfg)
+
+    # 建好（或确认已是最新）index，worker 里就只剩 mmap 读
+    daily = backend.get_history(pair_names, last=1)
+    if daily is None or daily.empty:
+        backend._log("Need daily.csv first.", logger)
+        return []
+    backend.get_history(pair_names, fields=RV_ALL, last=1)
+
+    out_dir = Path(out_dir) if out_dir else REPORT_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+    workers = workers or min(len(pair_names) + 1, os.cpu_count() or 1)
+
+    backend._log(f"Export {len(pair_names)} pairs → {out_dir} ({fmt}, {workers} workers)", logger)
+
+    paths = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as ex:
+        futs = {ex.submit(_render_pair, p, out_dir, fmt): p for p in pair_names}
+        futs[ex.submit(_render_corr, pair_names, out_dir, fmt)] = "correlation"
+        for fut in as_completed(futs):
+            try:
+                paths.extend(fut.result())
+            except Exception as e:
+                backend._log(f"Export {futs[fut]} failed: {e}", logger)
+
+    backend._log(f"Exported {len(paths)} charts to {out_dir}", logger)
+    return paths
@@ -0,0 +1,30 @@
+"""Paths, config and logging shared by the backend modules."""
+from pathlib import Path
+from datetime import datetime
+
+import yaml
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / "data"
+
+DAILY_PATH = DATA_DIR / "daily.csv"
+INTRADAY_PATH = DATA_DIR / "intraday.csv"
+VOL_PATH = DATA_DIR / "volatility.csv"
+
+
+def ensure_data_dir():
+    DATA_DIR.mkdir(exist_ok=True)
+
+
+def load_config():
+    cfg_path = BASE_DIR / "config.yaml"
+    with open(cfg_path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def _log(msg: str, logger=None):
+    ts = datetime.utcnow().isoformat(timespec="seconds")
+    line = f"[{ts}] {msg}"
+    print(line)
+    if logger is not None:
+        logger(line)
@@ -0,0 +1,188 @@
+"""Local snapshot fan-out: one intraday poller shared by many GUI clients.
+
+The server runs `update_intraday_snapshot` on the configured interval and
+pushes each new snapshot, plus the dashboard fields, to every connected
+client as one JSON object per line over a local TCP socket:
+
+    {"type": "snapshot", "ts": "...", "ticks": {pair: price},
+     "dashboard": [{"pair", "last", "prev", "pips", "pct"}, ...],
+     "alerts": [{"rule", "subject", "value", "threshold", ...}, ...]}
+
+Alerts fired here are also written to the alert file / socket by
+`alerts.AlertEngine`, so clients only need to display them.
+
+Start it with `python main.py --api-key KEY --action serve`.
+"""
+import asyncio
+import json
+import socket
+import threading
+
+import alerts
+import main as backend
+
+# 每个客户端最多积压多少条，满了丢最旧的（慢客户端不拖累其他人）
+MAX_BACKLOG = 16
+
+
+class SnapshotServer:
+    def __init__(self, api_key: str, host="127.0.0.1", port=8765, interval=120, logger=None):
+        self.api_key = api_key
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.logger = logger
+        self.pair_names, _ = backend._get_pairs_and_symbols(backend.load_config())
+
+        self._clients = set()
+        self._last_msg = None
+        self.alerts = alerts.AlertEngine(logger=logger)
+
+    def _poll_once(self):
+        """Snapshot + payload; runs in a worker thread (may rebuild the index / alert state)."""
+        df_new = backend.update_intraday_snapshot(self.api_key, self.logger)
+        if df_new is None or df_new.empty:
+            return None
+        return self._build_payload(df_new)
+
+    def _build_payload(self, df_new) -> dict:
+        ticks = dict(zip(df_new["pair"], df_new["price"].astype(float)))
+        return {
+            "type": "snapshot",
+            "ts": str(df_new["ts"].iloc[0]),
+            "ticks": ticks,
+            "dashboard": backend.dashboard_rows(backend.get_history(self.pair_names, last=2), ticks),
+            "alerts": self.alerts.evaluate(ticks),
+        }
+
+    def publish(self, payload: dict):
+        msg = (json.dumps(payload) + "\n").encode("utf-8")
+        self._last_msg = msg
+        for q in list(self._clients):
+            if q.full():
+                q.get_nowait()
+            q.put_nowait(msg)
+
+    # ---------- clients ----------
+    async def _handle_client(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        q = asyncio.Queue(maxsize=MAX_BACKLOG)
+        if self._last_msg is not None:
+            q.put_nowait(self._last_msg)
+        self._clients.add(q)
+        backend._log(f"fanout: client {peer} connected ({len(self._clients)} total)", self.logger)
+
+        # 客户端断开时 reader 读到 EOF
+        eof = asyncio.ensure_future(reader.read())
+        try:
+            while True:
+                get = asyncio.ensure_future(q.get())
+                done, _ = await asyncio.wait({get, eof}, return_when=asyncio.FIRST_COMPLETED)
+                if eof in done:
+                    get.cancel()
+                    break
+                writer.write(get.result())
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            eof.cancel()
+            self._clients.discard(q)
+            writer.close()
+            backend._log(f"fanout: client {peer} left ({len(self._clients)} total)", self.logger)
+
+    # ---------- poller ----------
+    async def _poll_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            try:
+                # 抓价和 payload（get_history / alerts 可能要重建 index）都在线程里做，
+                # event loop 只负责 publish，不卡住正在推送的客户端
+                payload = await loop.run_in_executor(None, self._poll_once)
+                if payload is not None:
+                    self.publish(payload)
+            except Exception as e:
+                backend._log(f"fanout: poll failed: {e}", self.logger)
+            await asyncio.sleep(max(0.0, self.interval - (loop.time() - t0)))
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        backend._log(
+            f"fanout: serving on {self.host}:{self.port}, polling every {self.interval}s",
+            self.logger,
+        )
+        async with server:
+            await asyncio.gather(server.serve_forever(), self._poll_loop())
+
+
+def serve(api_key: str, logger=None):
+    cfg = backend.load_config()
+    fan_cfg = cfg.get("fanout", {})
+    server = SnapshotServer(
+        api_key,
+        host=fan_cfg.get("host", "127.0.0.1"),
+        port=int(fan_cfg.get("port", 8765)),
+        interval=float(cfg.get("intraday", {}).get("seconds", 120)),
+        logger=logger,
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        backend._log("fanout: stopped.", logger)
+
+
+class SnapshotSubscriber(threading.Thread):
+    """Background client; calls `on_message(payload)` for every pushed line.
+
+    Reconnects every `retry` seconds while the server is unreachable.
+    `on_message` runs on this thread — GUI code must hand it to Tk itself.
+    """
+
+    def __init__(self, host, port, on_message, logger=None, retry=2.0):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.on_message = on_message
+        self.logger = logger
+        self.retry = retry
+        self._stop_evt = threading.Event()
+
+    def stop(self):
+        self._stop_evt.set()
+
+    def run(self):
+        while not self._stop_evt.is_set():
+            try:
+                with socket.create_connection((self.host, self.port), timeout=5) as sock:
+                    sock.settimeout(1.0)
+                    backend._log(f"Subscribed to fanout {self.host}:{self.port}", self.logger)
+                    self._read_lines(sock)
+            except OSError as e:
+                if not self._stop_evt.is_set():
+                    backend._log(f"fanout unavailable ({e}); retry in {self.retry}s", self.logger)
+            self._stop_evt.wait(self.retry)
+
+    def _read_lines(self, sock):
+        buf = b""
+        while not self._stop_evt.is_set():
+            try:
+                chunk = sock.recv(65536)
+            except socket.timeout:
+                continue
+            if not chunk:
+                return
+            buf += chunk
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                if not line:
+                    continue
+                try:
+                    msg = json.loads(line)
+                    if not isinstance(msg, dict):
+                        raise ValueError("not a JSON object")
+                except ValueError as e:
+                    # 一行坏数据不应该让订阅线程悄悄死掉
+                    backend._log(f"fanout: skipped malformed line ({e}): {line[:120]!r}", self.logger)
+                    continue
+                self.on_message(msg)
@@ -1,13 +1,16 @@
+import queue
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 from pathlib import Path
 
-import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
-import seaborn as sns
 
 import main as backend
+import alerts
+import charts
+import fanout
+import risk
+import ticks
 
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
@@ -36,6 +39,12 @@ class FXApp(tk.Tk):
 
         self._build_ui()
 
+        try:
+            self.alert_engine = alerts.AlertEngine(self.cfg, logger=self.log)
+        except ValueError as e:
+            self.alert_engine = None
+            messagebox.showerror("Error", f"Alert rules: {e}")
+
     def log(self, msg: str):
         if hasattr(self, "log_text"):
             self.log_text.insert(tk.END, msg + "\n")
@@ -45,50 +54,22 @@ class FXApp(tk.Tk):
     # ==========================================
     #         集中数据入口：daily / vol / returns
     # ==========================================
-    def _load_daily_df(self):
-        path = DATA_DIR / "daily.csv"
-        if not path.exists():
-            messagebox.showwarning("Warning", "daily.csv not found. Run data tab first.")
-            return None
-
-        df = pd.read_csv(path)
-        if "date" not in df.columns:
-            messagebox.showerror("Error", "daily.csv missing 'date' column.")
-            return None
-
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        df = df.dropna(subset=["date"]).sort_values("date").set_index("date")
-
-        # 去掉 unnamed
-        bad = [c for c in df.columns if c.lower().startswith("unnamed")]
-        if bad:
-            df = df.drop(columns=bad)
-
-        # 只保留 config 里的 pairs（防止 XPTUSD 等残留）
-        keep_cols = [c for c in df.columns if c in self.pair_names]
-        df = df[keep_cols]
-
-        return df
-
-    def _load_vol_df(self):
-        path = DATA_DIR / "volatility.csv"
-        if not path.exists():
-            return None
-
-        df = pd.read_csv(path, parse_dates=["date"])
-        if "pair" not in df.columns:
+    def _load_daily_df(self, last=None):
+        try:
+            df = backend.get_history(self.pair_names, last=last)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return None
 
-        df = df[df["pair"].isin(self.pair_names)]
-        df = df.sort_values(["date", "pair"])
+        if df is None:
+            messagebox.showwarning("Warning", "daily.csv not found. Run data tab first.")
         return df
 
     def _load_returns(self):
         df = self._load_daily_df()
         if df is None:
             return None
-        rets = np.log(df / df.shift(1))
-        return rets.dropna(how="all")
+        return backend.compute_log_returns(df)
 
     # ==========================================
     #                  UI 总框架
@@ -101,16 +82,19 @@ class FXApp(tk.Tk):
         self.tab_dashboard = ttk.Frame(notebook)
         self.tab_history = ttk.Frame(notebook)
         self.tab_corr = ttk.Frame(notebook)
+        self.tab_risk = ttk.Frame(notebook)
 
         notebook.add(self.tab_data, text="Data")
         notebook.add(self.tab_dashboard, text="Dashboard")
         notebook.add(self.tab_history, text="History & Vol")
         notebook.add(self.tab_corr, text="Correlation")
+        notebook.add(self.tab_risk, text="Risk")
 
         self._build_tab_data()
         self._build_tab_dashboard()
         self._build_tab_history()
         self._build_tab_corr()
+        self._build_tab_risk()
 
     # ==========================================
     #              TAB 1: DATA
@@ -127,6 +111,8 @@ class FXApp(tk.Tk):
                    command=self.on_intraday).pack(side=tk.LEFT, padx=5)
         ttk.Button(frame, text="4. Recompute Vol",
                    command=self.on_recompute_vol).pack(side=tk.LEFT, padx=5)
+        ttk.Button(frame, text="Memory Report",
+                   command=self.on_memory_report).pack(side=tk.RIGHT, padx=5)
 
         self.log_text = tk.Text(self.tab_data, height=25)
         self.log_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
@@ -145,7 +131,9 @@ class FXApp(tk.Tk):
 
     def on_intraday(self):
         try:
-            backend.update_intraday_snapshot(self.api_key, logger=self.log)
+            df_new = backend.update_intraday_snapshot(self.api_key, logger=self.log)
+            if df_new is not None and self.alert_engine is not None:
+                self.alert_engine.evaluate(dict(zip(df_new["pair"], df_new["price"])))
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
@@ -155,6 +143,12 @@ class FXApp(tk.Tk):
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def on_memory_report(self):
+        try:
+            ticks.memory_report(self.tick_store, backend.mapped_history(), logger=self.log)
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+
     # ==========================================
     #              TAB 2: DASHBOARD
     # ==========================================
@@ -165,6 +159,17 @@ class FXApp(tk.Tk):
         ttk.Button(frame, text="Refresh Dashboard",
                    command=self.refresh_dashboard).pack(side=tk.LEFT, padx=5)
 
+        # 订阅本地 fanout 服务（main.py --action serve），代替自己轮询
+        self.sub_btn = ttk.Button(frame, text="Subscribe Live",
+                                  command=self.toggle_subscribe)
+        self.sub_btn.pack(side=tk.LEFT, padx=5)
+        self.feed_status = ttk.Label(frame, text="", foreground="gray")
+        self.feed_status.pack(side=tk.LEFT, padx=10)
+        self.subscriber = None
+        self.feed_queue = queue.Queue()
+        self._drain_id = None
+        self.tick_store = None
+
         self.table = ttk.Treeview(
             self.tab_dashboard,
             columns=("pair", "last", "prev", "chg", "chg_pct"),
@@ -184,44 +189,41 @@ class FXApp(tk.Tk):
         self.table.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
     def _load_latest_intraday(self):
-        path = DATA_DIR / "intraday.csv"
-
-        if not path.exists():
+        if not backend.INTRADAY_PATH.exists():
             messagebox.showwarning("Warning", "intraday.csv not found. Run Intraday Snapshot first.")
             return None
 
-        df = pd.read_csv(path)
-
-        # Required columns
-        if not {"ts", "pair", "price"}.issubset(df.columns):
-            messagebox.showerror("Error", "intraday.csv missing required columns.")
+        # 常驻的 TickStore 只增量读取 intraday.csv 新追加的部分
+        if self.tick_store is None:
+            self.tick_store = ticks.TickStore(self.pair_names)
+        try:
+            self.tick_store.refresh(backend.INTRADAY_PATH)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return None
 
-        # Convert timestamp 
-        df["ts"] = pd.to_datetime(df["ts"], errors="coerce")
-        df = df.dropna(subset=["ts"])
-
-        # Keep the latest tick per pair
-        df = df.sort_values("ts").groupby("pair").tail(1)
-        df = df.set_index("pair")
-
-        return df
-    
-    def _compute_pips(self, pair, change):
-        pair = pair.upper()
+        return self.tick_store.latest()
 
-        # Metals
-        if pair.startswith("XAU") or pair.startswith("XAG"):
-            return change * 10   
-        # JPY pairs 
-        if pair.endswith("JPY"):
-            return change * 100
-        # All others
-        return change * 10000
+    def _fill_dashboard(self, rows):
+        # 清空表格
+        for row in self.table.get_children():
+            self.table.delete(row)
 
+        for r in rows:
+            self.table.insert(
+                "",
+                tk.END,
+                values=(
+                    r["pair"],
+                    f"{r['last']:.6f}",
+                    f"{r['prev']:.6f}",
+                    f"{r['pips']:.1f}",
+                    f"{r['pct']:.2f}%"
+                ),
+            )
 
     def refresh_dashboard(self):
-        df_daily = self._load_daily_df()
+        df_daily = self._load_daily_df(last=2)
         df_intr = self._load_latest_intraday()
 
         if df_daily is None or df_daily.empty:
@@ -232,41 +234,61 @@ class FXApp(tk.Tk):
             messagebox.showerror("Error", "intraday.csv missing or empty.")
             return
 
-        # 清空表格
-        for row in self.table.get_children():
-            self.table.delete(row)
+        rows = backend.dashboard_rows(df_daily, df_intr["price"].to_dict())
+        self._fill_dashboard(rows)
+
+    # --------- Live feed (fanout) -----------
+    def toggle_subscribe(self):
+        if self.subscriber is not None:
+            self.subscriber.stop()
+            self.subscriber = None
+            if self._drain_id is not None:
+                self.after_cancel(self._drain_id)
+                self._drain_id = None
+            # 旧线程退出前可能还会往旧 queue 放消息，直接丢掉那个 queue
+            self.feed_queue = queue.Queue()
+            self.sub_btn.config(text="Subscribe Live")
+            self.feed_status.config(text="")
+            return
 
-        # 跟昨天fixing来对比
-        if len(df_daily) >= 2:
-            prev_fix = df_daily.iloc[-2]
+        fan_cfg = self.cfg.get("fanout", {})
+        feed = self.feed_queue = queue.Queue()
+        self.subscriber = fanout.SnapshotSubscriber(
+            fan_cfg.get("host", "127.0.0.1"),
+            int(fan_cfg.get("port", 8765)),
+            on_message=feed.put,
+            logger=lambda line: feed.put({"type": "log", "line": line}),
+        )
+        self.subscriber.start()
+        self.sub_btn.config(text="Unsubscribe")
+        self.feed_status.config(text="connecting…")
+        self._drain_id = self.after(100, self._drain_feed)
+
+    def _drain_feed(self):
+        # 订阅线程只往 queue 里放，Tk 只在主线程更新
+        latest = None
+        while True:
+            try:
+                msg = self.feed_queue.get_nowait()
+            except queue.Empty:
+                break
+            if msg.get("type") == "log":
+                self.log(msg["line"])
+            elif msg.get("type") == "snapshot":
+                latest = msg
+                # 服务端已经评估过并写了 alert file，这里只显示
+                for a in msg.get("alerts", []):
+                    self.log(f"ALERT {a['rule']} {a['subject']}: {a['value']:.4g} "
+                             f"(threshold {a['threshold']:g})")
+
+        if latest is not None:
+            self._fill_dashboard(latest["dashboard"])
+            self.feed_status.config(text=f"live @ {latest['ts']}")
+
+        if self.subscriber is not None:
+            self._drain_id = self.after(100, self._drain_feed)
         else:
-            prev_fix = df_daily.iloc[-1]
-
-        for pair in df_daily.columns:
-            if pair not in df_intr.index:
-                continue
-
-            last_price = df_intr.loc[pair, "price"]
-            fix_price = prev_fix[pair]
-
-            if pd.isna(fix_price):
-                continue
-
-            change = last_price - fix_price
-            pip_change = self._compute_pips(pair, change)
-            pct_change = (change / fix_price) * 100 if fix_price != 0 else 0
-
-            self.table.insert(
-                "",
-                tk.END,
-                values=(
-                    pair,
-                    f"{last_price:.6f}",
-                    f"{fix_price:.6f}",
-                    f"{pip_change:.1f}",
-                    f"{pct_change:.2f}%"
-                ),
-            )
+            self._drain_id = None
 
     # ==========================================
     #           TAB 3: HISTORY & VOL
@@ -306,37 +328,6 @@ class FXApp(tk.Tk):
             justify="left",
         ).pack(anchor="w", padx=5)
 
-    # --------- Technical Indicators -----------
-    @staticmethod # Bollinger Bands
-    def _compute_bollinger(px, window=20, num_std=2):
-        ma = px.rolling(window).mean()
-        std = px.rolling(window).std()
-        lower = ma - num_std * std
-        upper = ma + num_std * std
-        return ma, upper, lower
-
-    @staticmethod # MACD
-    def _compute_macd(px, fast=12, slow=26, signal=9):
-        ema_fast = px.ewm(span=fast, adjust=False).mean()
-        ema_slow = px.ewm(span=slow, adjust=False).mean()
-        macd = ema_fast - ema_slow
-        signal_line = macd.ewm(span=signal, adjust=False).mean()
-        hist = macd - signal_line
-        return macd, signal_line, hist
-
-    @staticmethod # Wilder's RSI
-    def _compute_rsi(px, window=14):
-        delta = px.diff()
-        gain = delta.clip(lower=0)
-        loss = -delta.clip(upper=0)
-
-        avg_gain = gain.ewm(alpha=1/window, adjust=False).mean()
-        avg_loss = loss.ewm(alpha=1/window, adjust=False).mean()
-
-        rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
-        return rsi
-
     def plot_history_and_indicators(self):
         pair = self.hist_pair.get()
         df = self._load_daily_df()
@@ -349,69 +340,12 @@ class FXApp(tk.Tk):
             messagebox.showwarning("Warning", "No price data for this pair.")
             return
 
-        # === Technical indicators ===
-        ma20, bb_up, bb_low = self._compute_bollinger(px, window=20, num_std=2)
-        ma60 = px.rolling(60).mean()
-        macd, macd_sig, macd_hist = self._compute_macd(px)
-        rsi = self._compute_rsi(px)
-
         # === Realized Vol ===
-        vol_df = self._load_vol_df()
-        rv_sub = None
-        if vol_df is not None:
-            v = vol_df[vol_df["pair"] == pair].copy()
-            if not v.empty:
-                v = v.set_index("date").sort_index()
-                cols = [c for c in ["rv_30", "rv_60", "rv_90"] if c in v.columns]
-                if cols:
-                    rv_sub = v[cols].reindex(px.index)
+        rv_sub = charts.rv_frame(pair, charts.RV_SHORT, index=px.index)
 
         # ==== Plot: 4x1 subplots ====
         fig, axes = plt.subplots(4, 1, figsize=(13, 10), sharex=True)
-        ax_price, ax_rv, ax_macd, ax_rsi = axes
-
-        # 1) Price + MA + Bollinger
-        ax_price.plot(px.index, px.values, label=f"{pair} Price", linewidth=1.2)
-        ax_price.plot(ma20.index, ma20.values, "--", label="MA20")
-        ax_price.plot(ma60.index, ma60.values, ":", label="MA60")
-
-        ax_price.fill_between(px.index, bb_low, bb_up, color="lightgray", alpha=0.4, label="Bollinger(20,2)")
-        ax_price.set_ylabel("Price")
-        ax_price.set_title(f"{pair} – Price, MA & Bollinger")
-        ax_price.grid(True)
-        ax_price.legend(loc="upper left")
-
-        # 2) Realized Vol
-        if rv_sub is not None:
-            for c in rv_sub.columns:
-                ax_rv.plot(rv_sub.index, rv_sub[c], label=c)
-            ax_rv.set_ylabel("Realized Vol")
-            ax_rv.set_title("Realized Volatility (RV_30 / RV_60 / RV_90)")
-            ax_rv.legend(loc="upper left")
-        else:
-            ax_rv.text(0.5, 0.5, "No RV data", ha="center", va="center", transform=ax_rv.transAxes)
-            ax_rv.set_title("Realized Volatility")
-        ax_rv.grid(True)
-
-        # 3) MACD
-        ax_macd.plot(macd.index, macd.values, label="MACD", linewidth=1.0)
-        ax_macd.plot(macd_sig.index, macd_sig.values, label="Signal", linewidth=1.0)
-        ax_macd.bar(macd_hist.index, macd_hist.values, label="Hist", alpha=0.4)
-        ax_macd.axhline(0, color="black", linewidth=0.8)
-        ax_macd.set_ylabel("MACD")
-        ax_macd.set_title("MACD (12,26,9)")
-        ax_macd.legend(loc="upper left")
-        ax_macd.grid(True)
-
-        # 4) RSI
-        ax_rsi.plot(rsi.index, rsi.values, label="RSI(14)", linewidth=1.0)
-        ax_rsi.axhline(70, color="red", linestyle="--", linewidth=0.8)
-        ax_rsi.axhline(30, color="green", linestyle="--", linewidth=0.8)
-        ax_rsi.set_ylabel("RSI")
-        ax_rsi.set_title("RSI (14)")
-        ax_rsi.set_ylim(0, 100)
-        ax_rsi.grid(True)
-        ax_rsi.legend(loc="upper left")
+        charts.draw_history(axes, pair, px, rv_sub)
 
         plt.tight_layout()
         plt.show()
@@ -421,35 +355,21 @@ class FXApp(tk.Tk):
         if not pair:
             return
 
-        vol_df = self._load_vol_df()
-        if vol_df is None:
+        if not backend.VOL_PATH.exists():
             messagebox.showerror("Error", "volatility.csv not found.")
             return
 
-        df = vol_df[vol_df["pair"] == pair].copy()
-        if df.empty:
+        df_surf = charts.rv_frame(pair, charts.RV_ALL)
+        if df_surf is None:
             messagebox.showwarning("Warning", f"No volatility data for {pair}.")
             return
 
-        df = df.sort_values("date")
-        mats = [c for c in ["rv_30", "rv_60", "rv_90", "rv_180", "rv_250"] if c in df.columns]
-        if not mats:
-            messagebox.showwarning("Warning", "No RV columns found.")
-            return
-        
-        df_surf = df.set_index("date")[mats]
-        df_surf.index = df_surf.index.strftime("%Y%m%d")
-        
         if df_surf.dropna(how="all").empty:
             messagebox.showerror("Error", "Realized vol surface is empty.")
             return
 
-        plt.figure(figsize=(10, 6))
-        sns.heatmap(df_surf.T, cmap="coolwarm")
-        plt.title(f"{pair} – Realized Volatility Surface")
-        plt.xlabel("Date")
-        plt.xticks(rotation = 45, ha = "right")
-        plt.ylabel("Window")
+        fig, ax = plt.subplots(figsize=(10, 6))
+        charts.draw_vol_surface(ax, pair, df_surf)
         plt.tight_layout()
         plt.show()
 
@@ -519,14 +439,75 @@ class FXApp(tk.Tk):
         if rets is None:
             return
 
-        corr = rets.corr()
-        plt.figure(figsize=(11, 9))
-        sns.heatmap(corr, cmap="coolwarm", square=True, annot=True,
-                    linewidths=0.4)
-        plt.title("Correlation Heatmap (Daily Log Returns)")
+        fig, ax = plt.subplots(figsize=(11, 9))
+        charts.draw_corr_heatmap(ax, rets.corr())
         plt.tight_layout()
         plt.show()
 
+    # ==========================================
+    #              TAB 5: RISK
+    # ==========================================
+    def _build_tab_risk(self):
+        frame = ttk.Frame(self.tab_risk)
+        frame.pack(side=tk.TOP, fill=tk.X, pady=5)
+
+        risk_cfg = self.cfg.get("risk") or {}
+
+        ttk.Label(frame, text="Positions:").pack(side=tk.LEFT, padx=5)
+        self.risk_path = tk.StringVar(
+            value=str(BASE_DIR / risk_cfg.get("positions", "data/positions.csv"))
+        )
+        ttk.Entry(frame, textvariable=self.risk_path, width=45).pack(side=tk.LEFT, padx=5)
+        ttk.Button(frame, text="Browse…", command=self.on_browse_positions).pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(frame, text="Confidence:").pack(side=tk.LEFT, padx=5)
+        self.risk_conf = tk.StringVar(value="0.95,0.99")
+        ttk.Entry(frame, textvariable=self.risk_conf, width=12).pack(side=tk.LEFT, padx=5)
+
+        ttk.Button(frame, text="Run VaR + Stress", command=self.run_risk).pack(side=tk.LEFT, padx=10)
+
+        ttk.Label(self.tab_risk, text="VaR / ES (1 day, USD)", foreground="gray").pack(anchor="w", padx=5)
+        self.risk_table = ttk.Treeview(self.tab_risk, show="headings", height=8)
+        self.risk_table.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        ttk.Label(self.tab_risk, text="Stress P&L (USD)", foreground="gray").pack(anchor="w", padx=5)
+        self.stress_table = ttk.Treeview(self.tab_risk, show="headings", height=8)
+        self.stress_table.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+    def on_browse_positions(self):
+        path = filedialog.askopenfilename(
+            initialdir=str(DATA_DIR), filetypes=[("CSV", "*.csv"), ("All files", "*.*")]
+        )
+        if path:
+            self.risk_path.set(path)
+
+    @staticmethod
+    def _fill_frame_table(table, df):
+        cols = ["book"] + [str(c) for c in df.columns]
+        table.delete(*table.get_children())
+        table["columns"] = cols
+        for col in cols:
+            table.heading(col, text=col)
+            table.column(col, width=110, anchor=tk.CENTER)
+        for book, row in df.iterrows():
+            table.insert("", tk.END, values=[book] + [f"{v:,.0f}" for v in row.values])
+
+    def run_risk(self):
+        path = self.risk_path.get()
+        if not path or not Path(path).exists():
+            messagebox.showerror("Error", "Positions file not found.")
+            return
+
+        try:
+            levels = [float(x) for x in self.risk_conf.get().split(",") if x.strip()]
+            result = risk.run_risk(path, confidence=levels, logger=self.log)
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            return
+
+        self._fill_frame_table(self.risk_table, result["var"])
+        self._fill_frame_table(self.stress_table, result["stress"])
+
 
 def main():
     app = FXApp()
@@ -1,50 +1,19 @@
 import os
+import json
+import shutil
+import tempfile
 from pathlib import Path
 from datetime import datetime, timedelta
 
-import requests
 import pandas as pd
 import numpy as np
-import yaml
 
-BASE_DIR = Path(__file__).resolve().parent
-DATA_DIR = BASE_DIR / "data"
-
-DAILY_PATH = DATA_DIR / "daily.csv"
-INTRADAY_PATH = DATA_DIR / "intraday.csv"
-VOL_PATH = DATA_DIR / "volatility.csv"
-
-
-def ensure_data_dir():
-    DATA_DIR.mkdir(exist_ok=True)
-
-
-def load_config():
-    cfg_path = BASE_DIR / "config.yaml"
-    with open(cfg_path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
-
-
-def _log(msg: str, logger=None):
-    ts = datetime.utcnow().isoformat(timespec="seconds")
-    line = f"[{ts}] {msg}"
-    print(line)
-    if logger is not None:
-        logger(line)
-
-
-def _request_json(url: str, headers: dict, params: dict, logger=None):
-    resp = requests.get(url, headers=headers, params=params, timeout=120)
-    try:
-        data = resp.json()
-    except Exception:
-        _log(f"HTTP {resp.status_code} – failed JSON: {resp.text[:300]}", logger)
-        resp.raise_for_status()
-
-    if not resp.ok or data.get("success") is False or "error" in data:
-        _log(f"API error: {data}", logger)
-        raise RuntimeError(f"API error: {data}")
-    return data
+from common import (
+    BASE_DIR, DATA_DIR, DAILY_PATH, INTRADAY_PATH, VOL_PATH,
+    ensure_data_dir, load_config, _log,
+)
+from providers import get_provider_pool
+from quality import STILL_STALE, TickFilter, get_intraday_filter, quarantine, screen_pair_frame
 
 
 # =========================================
@@ -97,25 +66,12 @@ def _map_symbols_to_pairs_frame(df_sym: pd.DataFrame, cfg, logger=None) -> pd.Da
 # =========================================
 #   1) FULL 5Y HISTORY
 # =========================================
-def fetch_full_history(api_key: str, logger=None):
-    ensure_data_dir()
-    if DAILY_PATH.exists():
-        _log("daily.csv exists — skip full history.", logger)
-        return
-
-    cfg = load_config()
-    base_url = cfg["api"]["base_url"]
+def fetch_daily_rates(api_key: str, start_date, end_date, cfg=None, logger=None) -> pd.DataFrame:
+    """Date × symbol frame of fixings in [start_date, end_date] (yearly chunks)."""
+    cfg = cfg or load_config()
     base_ccy = cfg["api"]["base_currency"]
     _, symbols = _get_pairs_and_symbols(cfg)
-    years_back = int(cfg["history"].get("years_back", 5))
-
-    end_date = datetime.utcnow().date()
-    start_date = end_date - timedelta(days=years_back * 365)
-
-    _log(f"Fetch history {start_date} → {end_date}", logger)
-
-    headers = {"apikey": api_key}
-    url = f"{base_url}/timeseries"
+    pool = get_provider_pool(cfg, api_key)
 
     all_rates = {}
 
@@ -123,32 +79,73 @@ def fetch_full_history(api_key: str, logger=None):
     while cur <= end_date:
         cur_end = min(cur + timedelta(days=364), end_date)
 
-        params = {
-            "start_date": cur.isoformat(),
-            "end_date": cur_end.isoformat(),
-            "base": base_ccy,
-            "symbols": ",".join(symbols),
-        }
-
         _log(f"Chunk {cur} → {cur_end}", logger)
-        data = _request_json(url, headers, params, logger)
-
-        rates_block = data.get("rates", {})
+        rates_block = pool.timeseries(
+            cur.isoformat(), cur_end.isoformat(), base_ccy, symbols, logger=logger
+        )
         for date_str, sym_map in rates_block.items():
             all_rates.setdefault(date_str, {}).update(sym_map)
 
         cur = cur_end + timedelta(days=1)
 
     if not all_rates:
-        raise RuntimeError("No data returned from API.")
+        return pd.DataFrame()
 
     df_sym = pd.DataFrame(all_rates).T.sort_index()
     df_sym.index = pd.to_datetime(df_sym.index)
     df_sym.index.name = "date"
+    return df_sym
+
+
+def _read_daily_csv():
+    if not DAILY_PATH.exists():
+        return None
+    return pd.read_csv(DAILY_PATH, parse_dates=["date"]).set_index("date").sort_index()
+
+
+def store_daily(df_new: pd.DataFrame, df_old=None, cfg=None, logger=None) -> pd.DataFrame:
+    """Screen new pair rows, merge them into daily.csv and return the full frame."""
+    cfg = cfg or load_config()
+    ensure_data_dir()
+
+    tf = TickFilter.from_config(cfg)
+    if df_old is not None:
+        for pair in df_old.columns:
+            for price in pd.to_numeric(df_old[pair], errors="coerce").tail(tf.window + 1):
+                tf.seed(pair, price)
+    df_new = screen_pair_frame(df_new, tf, "daily", logger)
+
+    if df_old is None:
+        df_all = df_new
+    else:
+        df_all = pd.concat([df_old, df_new])
+        df_all = df_all[~df_all.index.duplicated(keep="last")].sort_index()
+    df_all.to_csv(DAILY_PATH)
+
+    _log(f"daily.csv saved: now {df_all.shape}", logger)
+    return df_all
+
+
+def fetch_full_history(api_key: str, logger=None):
+    ensure_data_dir()
+    if DAILY_PATH.exists():
+        _log("daily.csv exists — skip full history.", logger)
+        return
+
+    cfg = load_config()
+    years_back = int(cfg["history"].get("years_back", 5))
+
+    end_date = datetime.utcnow().date()
+    start_date = end_date - timedelta(days=years_back * 365)
+
+    _log(f"Fetch history {start_date} → {end_date}", logger)
+
+    df_sym = fetch_daily_rates(api_key, start_date, end_date, cfg, logger)
+    if df_sym.empty:
+        raise RuntimeError("No data returned from API.")
 
     pair_df = _map_symbols_to_pairs_frame(df_sym, cfg, logger)
-    pair_df.to_csv(DAILY_PATH)
-    _log(f"Saved daily.csv shape {pair_df.shape}", logger)
+    store_daily(pair_df, None, cfg, logger)
 
 
 # =========================================
@@ -158,18 +155,11 @@ def update_daily_fixing(api_key: str, logger=None):
     ensure_data_dir()
     cfg = load_config()
 
-    base_url = cfg["api"]["base_url"]
-    base_ccy = cfg["api"]["base_currency"]
-    _, symbols = _get_pairs_and_symbols(cfg)
-
-    headers = {"apikey": api_key}
-    url = f"{base_url}/timeseries"
-
     if not DAILY_PATH.exists():
         _log("Run full_history first.", logger)
         return
 
-    df_old = pd.read_csv(DAILY_PATH, parse_dates=["date"]).set_index("date").sort_index()
+    df_old = _read_daily_csv()
     last_date = df_old.index.max().date()
 
     today = datetime.utcnow().date()
@@ -179,59 +169,37 @@ def update_daily_fixing(api_key: str, logger=None):
         _log("No new days to update.", logger)
         return
 
-    params = {
-        "start_date": start_date.isoformat(),
-        "end_date": today.isoformat(),
-        "base": base_ccy,
-        "symbols": ",".join(symbols),
-    }
-
-    data = _request_json(url, headers, params, logger)
-    rates_block = data.get("rates", {})
-
-    if not rates_block:
+    df_sym = fetch_daily_rates(api_key, start_date, today, cfg, logger)
+    if df_sym.empty:
         _log("No rates returned for daily fixing.", logger)
         return
 
-    df_sym = pd.DataFrame(rates_block).T
-    df_sym.index = pd.to_datetime(df_sym.index)
-    df_sym.index.name = "date"
-    df_sym = df_sym.sort_index()
-
     df_new = _map_symbols_to_pairs_frame(df_sym, cfg, logger)
-
-    df_all = pd.concat([df_old, df_new])
-    df_all = df_all[~df_all.index.duplicated(keep="last")].sort_index()
-    df_all.to_csv(DAILY_PATH)
-
-    _log(f"daily.csv updated: now {df_all.shape}", logger)
+    store_daily(df_new, df_old, cfg, logger)
 
 
 # =========================================
 #   3) INTRADAY SNAPSHOT
 # =========================================
-def update_intraday_snapshot(api_key: str, logger=None):
+def update_intraday_snapshot(api_key: str, logger=None, cfg=None):
     ensure_data_dir()
-    cfg = load_config()
+    cfg = cfg or load_config()
 
-    base_url = cfg["api"]["base_url"]
     base_ccy = cfg["api"]["base_currency"]
     pairs_cfg = cfg["pairs"]
     _, symbols = _get_pairs_and_symbols(cfg)
 
-    headers = {"apikey": api_key}
-    url = f"{base_url}/latest"
-
-    params = {"base": base_ccy, "symbols": ",".join(symbols)}
-    data = _request_json(url, headers, params, logger)
-    rates = data.get("rates", {})
+    pool = get_provider_pool(cfg, api_key)
+    rates = pool.latest(base_ccy, symbols, logger=logger)
 
     if not rates:
         _log(" No intraday rates returned.", logger)
         return
 
     ts = datetime.utcnow().isoformat(timespec="seconds")
+    tf = get_intraday_filter(cfg)
     rows = []
+    rejected = []
 
     for p in pairs_cfg:
         pair_name = p["name"]
@@ -244,13 +212,25 @@ def update_intraday_snapshot(api_key: str, logger=None):
         if rate is None:
             continue
 
-        price = float(rate)
+        try:
+            price = float(rate)
+        except (TypeError, ValueError):
+            price = np.nan
         if invert_flag:
-            price = 1.0 / price
+            price = 1.0 / price if price else np.inf
+
+        reason = tf.check(pair_name, price)
+        if reason == STILL_STALE:
+            continue
+        if reason is not None:
+            rejected.append({"ts": ts, "source": "intraday", "pair": pair_name,
+                             "value": price, "raw_rate": rate, "reason": reason})
+            continue
 
         rows.append({"ts": ts, "pair": pair_name, "price": price})
 
-    df_new = pd.DataFrame(rows)
+    quarantine(rejected, logger)
+    df_new = pd.DataFrame(rows, columns=["ts", "pair", "price"])
 
     if INTRADAY_PATH.exists():
         df_new.to_csv(INTRADAY_PATH, mode="a", index=False, header=False)
@@ -258,43 +238,347 @@ def update_intraday_snapshot(api_key: str, logger=None):
         df_new.to_csv(INTRADAY_PATH, index=False)
 
     _log(f"Intraday +{len(df_new)} rows written to {INTRADAY_PATH}", logger)
+    return df_new
 
 
 # =========================================
 #   4) REALIZED VOL
 # =========================================
-def compute_volatility(logger=None):
+def compute_volatility(logger=None, df=None):
+    """Rolling RV per pair → volatility.csv; `df` skips re-reading daily.csv."""
     ensure_data_dir()
-    if not DAILY_PATH.exists():
-        _log("Need daily.csv first.", logger)
-        return
-
-    df = pd.read_csv(DAILY_PATH, parse_dates=["date"]).set_index("date").sort_index()
+    if df is None:
+        if not DAILY_PATH.exists():
+            _log("Need daily.csv first.", logger)
+            return
+        df = _read_daily_csv()
 
     df = df.apply(pd.to_numeric, errors="coerce")
-    pairs = list(df.columns)
 
     rets = np.log(df / df.shift(1))
 
     windows = [30, 60, 90, 180, 250]
     vol_dict = {}
     for w in windows:
-        vol_dict[w] = rets.rolling(w).std() * np.sqrt(252)
+        vol_dict[f"rv_{w}"] = (rets.rolling(w).std() * np.sqrt(252)).stack(future_stack=True)
+
+    # 宽表 → (date, pair) 长表，保留 NaN 行
+    out = pd.concat(vol_dict, axis=1)
+    out.index.names = ["date", "pair"]
+    out = out.reset_index()
+    out["date"] = out["date"].dt.strftime("%Y-%m-%d")
+    out = out.sort_values(["date", "pair"])
+
+    out.to_csv(VOL_PATH, index=False)
+    _log(f"Saved volatility.csv {out.shape}", logger)
+    return out
+
+
+# =========================================
+#   5) DASHBOARD FIELDS
+# =========================================
+def load_daily_df(pair_names=None):
+    """daily.csv as a date-indexed frame of configured pairs; None if missing."""
+    if not DAILY_PATH.exists():
+        return None
+
+    df = pd.read_csv(DAILY_PATH)
+    if "date" not in df.columns:
+        raise ValueError("daily.csv missing 'date' column.")
+
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df = df.dropna(subset=["date"]).sort_values("date").set_index("date")
+
+    # 去掉 unnamed
+    bad = [c for c in df.columns if c.lower().startswith("unnamed")]
+    if bad:
+        df = df.drop(columns=bad)
+
+    # 只保留 config 里的 pairs（防止 XPTUSD 等残留）
+    if pair_names is not None:
+        df = df[[c for c in df.columns if c in pair_names]]
+
+    return df
+
+
+def load_vol_df(pair_names=None):
+    """volatility.csv in long format (date, pair, rv_*); None if missing."""
+    if not VOL_PATH.exists():
+        return None
+
+    cols = pd.read_csv(VOL_PATH, nrows=0).columns
+    if "pair" not in cols:
+        return None
+
+    # pair 用 category，RV 用 float32（年化波动率 7 位有效数字足够）
+    dtype = {"pair": "category"}
+    dtype.update({c: np.float32 for c in cols if c.startswith("rv_")})
+    df = pd.read_csv(VOL_PATH, parse_dates=["date"], dtype=dtype)
+
+    if pair_names is not None:
+        df = df[df["pair"].isin(pair_names)]
+    return df.sort_values(["date", "pair"])
+
+
+def compute_log_returns(df: pd.DataFrame) -> pd.DataFrame:
+    rets = np.log(df / df.shift(1))
+    return rets.dropna(how="all")
+
+
+def compute_pips(pair: str, change: float) -> float:
+    pair = pair.upper()
+
+    # Metals
+    if pair.startswith("XAU") or pair.startswith("XAG"):
+        return change * 10
+    # JPY pairs
+    if pair.endswith("JPY"):
+        return change * 100
+    # All others
+    return change * 10000
+
+
+def dashboard_rows(df_daily: pd.DataFrame, last_prices: dict) -> list:
+    """Last price vs previous fixing for every pair that has both."""
+    if df_daily is None or df_daily.empty:
+        return []
+
+    # 跟昨天fixing来对比
+    if len(df_daily) >= 2:
+        prev_fix = df_daily.iloc[-2]
+    else:
+        prev_fix = df_daily.iloc[-1]
 
     rows = []
+    for pair in df_daily.columns:
+        if pair not in last_prices:
+            continue
+
+        last_price = float(last_prices[pair])
+        fix_price = prev_fix[pair]
+
+        if pd.isna(fix_price):
+            continue
+
+        change = last_price - fix_price
+        rows.append({
+            "pair": pair,
+            "last": last_price,
+            "prev": float(fix_price),
+            "pips": float(compute_pips(pair, change)),
+            "pct": float((change / fix_price) * 100 if fix_price != 0 else 0),
+        })
+    return rows
 
-    for d in df.index:
-        d_str = d.date().isoformat()
+
+# =========================================
+#   6) HISTORY INDEX (date-range queries)
+# =========================================
+# daily.csv / volatility.csv 转成 data/index/ 下的 .npy：
+#   <store>_dates.npy   int64 days since epoch, sorted
+#   <store>_values.npy  daily float64 / vol float32, pair-major (pair, field, date) → 每个 pair 连续存放
+# 查询时 mmap 打开，二分查找日期，只读所需 pair 的那一段。
+INDEX_DIR = DATA_DIR / "index"
+
+_STORES = {
+    "daily": DAILY_PATH,
+    "vol": VOL_PATH,
+}
+
+_INDEX_CACHE = {}
+
+
+def _source_stamp(path: Path) -> list:
+    st = path.stat()
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _to_day(x) -> int:
+    return int(pd.Timestamp(x).to_datetime64().astype("datetime64[D]").astype(np.int64))
+
+
+def _store_dir(name: str, stamp) -> Path:
+    # 每个 source 版本一个目录：目录 rename 是原子的，读的一方要么看到完整的一份，要么看不到
+    return INDEX_DIR / f"{name}-{stamp[0]}-{stamp[1]}"
+
+
+def _write_store(name: str, dates, values, pairs, fields, stamp):
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{name}-", dir=INDEX_DIR))
+    try:
+        np.save(tmp / "dates.npy", np.ascontiguousarray(dates))
+        np.save(tmp / "values.npy", np.ascontiguousarray(values))
+        meta = {"pairs": list(pairs), "fields": list(fields), "source": list(stamp)}
+        with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        target = _store_dir(name, stamp)
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # 另一个进程已经发布了同一版本 → 直接用它的
+            if not target.exists():
+                raise
+            shutil.rmtree(tmp, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    # 自己已经不是最新版本时不清理，免得删掉别人刚发布的新版本
+    if _source_stamp(_STORES[name]) != list(stamp):
+        return
+    # 清掉旧版本；还在 mmap 旧文件的读者不受影响（POSIX），删不掉就留到下次
+    for old in INDEX_DIR.glob(f"{name}-*"):
+        if old != target:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def _build_daily_store():
+    stamp = _source_stamp(DAILY_PATH)  # 先取 stamp：读的过程中 CSV 再变，下次查询会重建
+    df = load_daily_df()
+    dates = df.index.values.astype("datetime64[D]").astype(np.int64)
+    values = df.apply(pd.to_numeric, errors="coerce").to_numpy(np.float64).T
+    pairs = list(df.columns)
+    _write_store("daily", dates, values[:, None, :], pairs, ["price"], stamp)
+
+
+def _build_vol_store():
+    stamp = _source_stamp(VOL_PATH)
+    df = load_vol_df()
+    if df is None:
+        raise ValueError("volatility.csv missing 'pair' column.")
+    fields = [c for c in df.columns if c.startswith("rv_")]
+    wide = df.pivot(index="date", columns="pair", values=fields).sort_index()
+    pairs = sorted(str(p) for p in df["pair"].unique())
+    dates = wide.index.values.astype("datetime64[D]").astype(np.int64)
+
+    values = np.full((len(pairs), len(fields), len(dates)), np.nan, dtype=np.float32)
+    for fi, field in enumerate(fields):
+        block = wide[field].reindex(columns=pairs).to_numpy(np.float32)
+        values[:, fi, :] = block.T
+    _write_store("vol", dates, values, pairs, fields, stamp)
+
+
+_BUILDERS = {"daily": _build_daily_store, "vol": _build_vol_store}
+
+
+def build_history_index(logger=None):
+    """(Re)build the on-disk index for every source CSV that exists."""
+    for name, source in _STORES.items():
+        if source.exists():
+            _BUILDERS[name]()
+            _INDEX_CACHE.pop(name, None)
+            _log(f"History index '{name}' rebuilt.", logger)
+
+
+def _open_store(name: str):
+    """mmap'ed (meta, dates, values) for a store, rebuilding it if stale."""
+    source = _STORES[name]
+    if not source.exists():
+        return None
+
+    stamp = _source_stamp(source)
+    cached = _INDEX_CACHE.get(name)
+    if cached is not None and cached[0]["source"] == stamp:
+        return cached
+
+    for _ in range(3):
+        store = _store_dir(name, stamp)
+        try:
+            if not store.exists():
+                _BUILDERS[name]()
+            with open(store / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            dates = np.load(store / "dates.npy", mmap_mode="r")
+            values = np.load(store / "values.npy", mmap_mode="r")
+            break
+        except FileNotFoundError:
+            # CSV 在这期间又变了，旧版本被别的进程清掉 → 按新 stamp 再来
+            stamp = _source_stamp(source)
+    else:
+        raise RuntimeError(f"History index '{name}' keeps changing; try again.")
+
+    _INDEX_CACHE[name] = (meta, dates, values)
+    return _INDEX_CACHE[name]
+
+
+def _query_store(name, pairs, fields, start, end, last):
+    opened = _open_store(name)
+    if opened is None:
+        return None
+    meta, dates, values = opened
+
+    lo = 0 if start is None else int(np.searchsorted(dates, _to_day(start), side="left"))
+    hi = len(dates) if end is None else int(np.searchsorted(dates, _to_day(end), side="right"))
+    if last is not None:
+        lo = max(lo, hi - last)
+
+    pair_pos = {p: i for i, p in enumerate(meta["pairs"])}
+    field_pos = {f: i for i, f in enumerate(meta["fields"])}
+    if pairs is None:
+        pairs = meta["pairs"]
+
+    cols = {}
+    for field in fields:
+        fi = field_pos.get(field)
+        if fi is None:
+            continue
         for pair in pairs:
-            rec = {"date": d_str, "pair": pair}
-            for w in windows:
-                rv = vol_dict[w].loc[d, pair]
-                rec[f"rv_{w}"] = float(rv) if pd.notna(rv) else None
-            rows.append(rec)
+            pi = pair_pos.get(pair)
+            if pi is not None:
+                cols[(field, pair)] = np.array(values[pi, fi, lo:hi])
 
-    out = pd.DataFrame(rows).sort_values(["date", "pair"])
-    out.to_csv(VOL_PATH, index=False)
-    _log(f"Saved volatility.csv {out.shape}", logger)
+    index = pd.DatetimeIndex(np.asarray(dates[lo:hi]).astype("datetime64[D]"), name="date")
+    columns = pd.MultiIndex.from_arrays(
+        [[f for f, _ in cols], [p for _, p in cols]], names=["field", "pair"]
+    )
+    data = np.column_stack(list(cols.values())) if cols else np.empty((len(index), 0))
+    return pd.DataFrame(data, index=index, columns=columns)
+
+
+def get_history(pairs=None, start=None, end=None, fields="price", last=None):
+    """Stored history for `pairs` between `start` and `end` (inclusive).
+
+    fields: "price" (daily fixings) and/or "rv_30" … "rv_250". A single
+    field name returns a date × pair frame; a list returns columns
+    MultiIndexed by (field, pair). `last` keeps only the final N dates of
+    the range. Returns None when the underlying CSV does not exist yet.
+    """
+    single = isinstance(fields, str)
+    field_list = [fields] if single else list(fields)
+    if isinstance(pairs, str):
+        pairs = [pairs]
+
+    wanted = {
+        "daily": [f for f in field_list if f == "price"],
+        "vol": [f for f in field_list if f != "price"],
+    }
+
+    frames = []
+    for name, store_fields in wanted.items():
+        if not store_fields:
+            continue
+        df = _query_store(name, pairs, store_fields, start, end, last)
+        if df is not None:
+            frames.append(df)
+
+    if not frames:
+        return None
+
+    out = frames[0] if len(frames) == 1 else pd.concat(frames, axis=1).sort_index()
+    if single:
+        out = out[fields] if fields in out.columns.get_level_values("field") else out.iloc[:, :0]
+    return out
+
+
+def mapped_history() -> dict:
+    """{label: (dates, values)} of the mmap'ed history stores, for memory_report."""
+    out = {}
+    for name, label in (("daily", "daily history (mmap)"), ("vol", "vol tenors (mmap, float32)")):
+        opened = _open_store(name)
+        if opened is not None:
+            out[label] = opened[1:]
+    return out
 
 
 # =========================================
@@ -304,15 +588,26 @@ def main():
     import argparse
 
     parser = argparse.ArgumentParser(description="FX Aggregator – data pipeline")
-    parser.add_argument("--api-key", required=True, help="ExchangeRatesData (apilayer) API key")
+    parser.add_argument("--api-key", help="ExchangeRatesData (apilayer) API key")
     parser.add_argument(
         "--action",
-        choices=["full_history", "daily_fix", "intraday", "vol"],
+        choices=[
+            "full_history", "daily_fix", "intraday", "vol",
+            "serve", "export", "risk", "memory", "nightly",
+        ],
         required=True,
         help="Which step to run",
     )
+    parser.add_argument("--out", help="export: output directory (default data/reports)")
+    parser.add_argument("--format", choices=["png", "pdf"], default="png", help="export: file format")
+    parser.add_argument("--workers", type=int, help="export: process pool size")
+    parser.add_argument("--positions", help="risk: positions CSV (pair,notional[,book])")
+    parser.add_argument("--confidence", default="0.95,0.99", help="risk: comma-separated confidence levels")
     args = parser.parse_args()
 
+    if args.action in ("full_history", "daily_fix", "intraday", "serve", "nightly") and not args.api_key:
+        parser.error(f"--api-key is required for --action {args.action}")
+
     if args.action == "full_history":
         fetch_full_history(args.api_key)
     elif args.action == "daily_fix":
@@ -321,6 +616,26 @@ def main():
         update_intraday_snapshot(args.api_key)
     elif args.action == "vol":
         compute_volatility()
+    elif args.action == "serve":
+        import fanout
+        fanout.serve(args.api_key)
+    elif args.action == "export":
+        import charts
+        charts.export_reports(args.out, fmt=args.format, workers=args.workers)
+    elif args.action == "risk":
+        import risk
+        cfg = load_config()
+        positions = args.positions or BASE_DIR / (cfg.get("risk") or {}).get("positions", "data/positions.csv")
+        levels = [float(x) for x in args.confidence.split(",") if x.strip()]
+        print(risk.format_report(risk.run_risk(positions, confidence=levels)))
+    elif args.action == "nightly":
+        import pipeline
+        pipeline.run_nightly(args.api_key)
+    elif args.action == "memory":
+        import ticks
+        store = ticks.TickStore(_get_pairs_and_symbols(load_config())[0])
+        store.refresh()
+        ticks.memory_report(store, mapped_history())
 
 
 if __name__ == "__main__":
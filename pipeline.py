@@ -0,0 +1,202 @@
+"""End-of-day pipeline: a DAG of stages run concurrently in one process.
+
+Each stage receives its dependencies' return values (frames stay in
+memory, nothing is re-read from CSV between stages). Stages start as soon
+as their dependencies finish, so independent branches overlap:
+
+    load_daily ─┬─ fetch_daily ── map_daily ─┐
+                └────────────────────────────┴─ store_daily ── vol ── index ─┐
+    intraday ────────────────────────────────────────────────────────────────┴─ alerts
+
+"io" stages (network / disk, blocking `requests`) run via asyncio.to_thread;
+"cpu" stages run in a dedicated thread pool — pandas / numpy kernels release
+the GIL and the frames are shared without pickling.
+
+    python main.py --api-key KEY --action nightly
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import main as backend
+
+
+class Stage:
+    def __init__(self, name, fn, deps=(), kind="cpu"):
+        if kind not in ("io", "cpu"):
+            raise ValueError(f"Stage {name}: kind must be 'io' or 'cpu'.")
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.kind = kind
+
+
+class StageSkipped(Exception):
+    pass
+
+
+def _toposort(stages):
+    by_name = {s.name: s for s in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("Duplicate stage names.")
+    for s in stages:
+        missing = [d for d in s.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"Stage {s.name}: unknown deps {missing}.")
+
+    order, state = [], {}
+
+    def visit(s):
+        if state.get(s.name) == "done":
+            return
+        if state.get(s.name) == "visiting":
+            raise ValueError(f"Cycle through stage {s.name}.")
+        state[s.name] = "visiting"
+        for d in s.deps:
+            visit(by_name[d])
+        state[s.name] = "done"
+        order.append(s)
+
+    for s in stages:
+        visit(s)
+    return order
+
+
+async def run_pipeline(stages, cpu_workers=4, logger=None) -> dict:
+    """Run a DAG; returns {"results", "timings", "wall"}. Failures skip dependents."""
+    order = _toposort(stages)
+    loop = asyncio.get_running_loop()
+    cpu_pool = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="cpu-stage")
+    t_start = time.perf_counter()
+
+    tasks = {}
+    timings = {}
+
+    async def run(stage):
+        try:
+            args = [await tasks[d] for d in stage.deps]
+        except Exception:
+            timings[stage.name] = {"status": "skipped", "start": None, "seconds": 0.0}
+            raise StageSkipped(stage.name)
+
+        t0 = time.perf_counter()
+        backend._log(f"pipeline: ▶ {stage.name}", logger)
+        try:
+            if stage.kind == "io":
+                result = await asyncio.to_thread(stage.fn, *args)
+            else:
+                result = await loop.run_in_executor(cpu_pool, stage.fn, *args)
+        except Exception as e:
+            timings[stage.name] = {"status": f"failed: {e}", "start": t0 - t_start,
+                                   "seconds": time.perf_counter() - t0}
+            backend._log(f"pipeline: ✖ {stage.name} failed: {e}", logger)
+            raise
+
+        timings[stage.name] = {"status": "ok", "start": t0 - t_start,
+                               "seconds": time.perf_counter() - t0}
+        backend._log(f"pipeline: ✔ {stage.name} ({timings[stage.name]['seconds']:.2f}s)", logger)
+        return result
+
+    try:
+        for stage in order:
+            tasks[stage.name] = asyncio.ensure_future(run(stage))
+        outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    finally:
+        cpu_pool.shutdown(wait=False)
+
+    results = {
+        name: out for name, out in zip(tasks, outcomes) if not isinstance(out, BaseException)
+    }
+    return {"results": results, "timings": timings, "wall": time.perf_counter() - t_start}
+
+
+def format_timings(report: dict) -> str:
+    lines = [f"{'stage':<14}{'start':>8}{'secs':>9}  status"]
+    rows = sorted(report["timings"].items(),
+                  key=lambda kv: (kv[1]["start"] is None, kv[1]["start"] or 0.0))
+    busy = 0.0
+    for name, t in rows:
+        start = f"{t['start']:.2f}" if t["start"] is not None else "-"
+        lines.append(f"{name:<14}{start:>8}{t['seconds']:>9.2f}  {t['status']}")
+        busy += t["seconds"]
+    lines.append(f"wall {report['wall']:.2f}s vs {busy:.2f}s summed stage time")
+    return "\n".join(lines)
+
+
+# =========================================
+#   Nightly DAG
+# =========================================
+def nightly_stages(api_key: str, cfg=None, logger=None) -> list:
+    """full_history-or-daily_fix → vol → index, overlapped with intraday."""
+    cfg = cfg or backend.load_config()
+
+    def load_daily():
+        return backend._read_daily_csv()
+
+    def fetch_daily(df_old):
+        today = datetime.utcnow().date()
+        if df_old is None:
+            years_back = int(cfg["history"].get("years_back", 5))
+            start = today - timedelta(days=years_back * 365)
+        else:
+            start = df_old.index.max().date() + timedelta(days=1)
+        if start > today:
+            backend._log("No new days to update.", logger)
+            return None
+        return backend.fetch_daily_rates(api_key, start, today, cfg, logger)
+
+    def map_daily(df_sym):
+        if df_sym is None or df_sym.empty:
+            return None
+        return backend._map_symbols_to_pairs_frame(df_sym, cfg, logger)
+
+    def store_daily(df_old, df_new):
+        if df_new is None:
+            if df_old is None:
+                raise RuntimeError("No data returned from API.")
+            return df_old
+        return backend.store_daily(df_new, df_old, cfg, logger)
+
+    def intraday():
+        return backend.update_intraday_snapshot(api_key, logger, cfg=cfg)
+
+    def vol(df_all):
+        return backend.compute_volatility(logger, df=df_all)
+
+    def index(_vol):
+        backend.build_history_index(logger)
+
+    def alerts_check(df_ticks, _index):
+        import alerts
+        if df_ticks is None or df_ticks.empty:
+            return []
+        engine = alerts.AlertEngine(cfg, logger=logger)
+        return engine.evaluate(dict(zip(df_ticks["pair"], df_ticks["price"])))
+
+    return [
+        Stage("load_daily", load_daily, kind="io"),
+        Stage("fetch_daily", fetch_daily, deps=["load_daily"], kind="io"),
+        Stage("map_daily", map_daily, deps=["fetch_daily"], kind="cpu"),
+        Stage("store_daily", store_daily, deps=["load_daily", "map_daily"], kind="io"),
+        Stage("intraday", intraday, kind="io"),
+        Stage("vol", vol, deps=["store_daily"], kind="cpu"),
+        Stage("index", index, deps=["vol"], kind="cpu"),
+        Stage("alerts", alerts_check, deps=["intraday", "index"], kind="cpu"),
+    ]
+
+
+def run_nightly(api_key: str, logger=None) -> dict:
+    """Run the nightly DAG; raises RuntimeError (non-zero exit) if any stage did not finish."""
+    cfg = backend.load_config()
+    report = asyncio.run(run_pipeline(nightly_stages(api_key, cfg, logger), logger=logger))
+    backend._log("pipeline timings:\n" + format_timings(report), logger)
+
+    failed = [n for n, t in report["timings"].items() if t["status"].startswith("failed")]
+    skipped = [n for n, t in report["timings"].items() if t["status"] == "skipped"]
+    if failed or skipped:
+        # 细节已经在上面的 timings 里
+        raise RuntimeError(
+            f"nightly pipeline incomplete: failed {failed or '-'}, skipped {skipped or '-'}"
+        )
+    return report
@@ -0,0 +1,333 @@
+"""Rate providers: apilayer / HTTP / local file drop, pooled with hedging and failover.
+
+`get_provider_pool(cfg, api_key)` builds the pool from config.yaml
+`providers` and caches it per process so health tracking survives
+across calls.
+"""
+import json
+import time
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+import requests
+
+from common import BASE_DIR, _log
+
+
+def _request_json(url: str, headers: dict, params: dict, logger=None, timeout=120):
+    resp = requests.get(url, headers=headers, params=params, timeout=timeout)
+    try:
+        data = resp.json()
+    except Exception:
+        _log(f"HTTP {resp.status_code} – failed JSON: {resp.text[:300]}", logger)
+        resp.raise_for_status()
+
+    if not resp.ok or data.get("success") is False or "error" in data:
+        _log(f"API error: {data}", logger)
+        raise RuntimeError(f"API error: {data}")
+    return data
+
+
+class RateProvider(ABC):
+    """One source of base-currency rates.
+
+    `latest` returns {symbol: rate}; `timeseries` returns
+    {date_str: {symbol: rate}} — the same shapes apilayer uses.
+    The pool only calls the operations listed in `supports`.
+    """
+
+    name = "provider"
+    supports = ("latest", "timeseries")
+
+    @abstractmethod
+    def latest(self, base, symbols, logger=None) -> dict:
+        ...
+
+    @abstractmethod
+    def timeseries(self, start_date, end_date, base, symbols, logger=None) -> dict:
+        ...
+
+
+class ApilayerProvider(RateProvider):
+    """apilayer ExchangeRatesData, or any HTTP source speaking the same API."""
+
+    def __init__(self, name, base_url, api_key, key_header="apikey", timeout=120,
+                 timeseries_timeout=None):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.headers = {key_header: api_key} if api_key else {}
+        self.timeout = timeout
+        # 一年一块的 timeseries 比 latest 慢得多
+        self.timeseries_timeout = timeseries_timeout or timeout
+
+    def latest(self, base, symbols, logger=None) -> dict:
+        params = {"base": base, "symbols": ",".join(symbols)}
+        data = _request_json(f"{self.base_url}/latest", self.headers, params, logger, self.timeout)
+        return data.get("rates", {})
+
+    def timeseries(self, start_date, end_date, base, symbols, logger=None) -> dict:
+        params = {
+            "start_date": start_date,
+            "end_date": end_date,
+            "base": base,
+            "symbols": ",".join(symbols),
+        }
+        data = _request_json(
+            f"{self.base_url}/timeseries", self.headers, params, logger, self.timeseries_timeout
+        )
+        return data.get("rates", {})
+
+
+class FileDropProvider(RateProvider):
+    """Rates dropped as JSON on local disk (e.g. a bank file drop).
+
+    `path` holds {"base": "USD", "rates": {...}} for latest;
+    `history_path` (optional) holds {"rates": {date: {...}}} for timeseries.
+    A drop older than `max_age` seconds is treated as a failure.
+    """
+
+    def __init__(self, name, path, history_path=None, max_age=600):
+        self.name = name
+        self.path = Path(path)
+        self.history_path = Path(history_path) if history_path else None
+        self.max_age = max_age
+        self.supports = ("latest", "timeseries") if self.history_path else ("latest",)
+
+    @staticmethod
+    def _read(path: Path) -> dict:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def latest(self, base, symbols, logger=None) -> dict:
+        age = time.time() - self.path.stat().st_mtime
+        if self.max_age and age > self.max_age:
+            raise RuntimeError(f"{self.name}: file drop is stale ({age:.0f}s old)")
+
+        data = self._read(self.path)
+        if data.get("base", base) != base:
+            raise RuntimeError(f"{self.name}: base {data.get('base')} != {base}")
+        rates = data.get("rates", {})
+        return {s: rates[s] for s in symbols if s in rates}
+
+    def timeseries(self, start_date, end_date, base, symbols, logger=None) -> dict:
+        if self.history_path is None:
+            raise RuntimeError(f"{self.name}: no history_path configured")
+
+        data = self._read(self.history_path)
+        if data.get("base", base) != base:
+            raise RuntimeError(f"{self.name}: base {data.get('base')} != {base}")
+        out = {}
+        for date_str, sym_map in data.get("rates", {}).items():
+            if start_date <= date_str <= end_date:
+                out[date_str] = {s: sym_map[s] for s in symbols if s in sym_map}
+        return out
+
+
+class ProviderHealth:
+    """EWMA latency + consecutive-failure circuit breaker for one provider."""
+
+    def __init__(self, alpha=0.3, max_failures=3, cooldown=60.0):
+        self.alpha = alpha
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.latency = None
+        self.failures = 0
+        self.down_until = 0.0
+        self._lock = threading.Lock()
+
+    def record_success(self, elapsed: float):
+        with self._lock:
+            if self.latency is None:
+                self.latency = elapsed
+            else:
+                self.latency = self.alpha * elapsed + (1 - self.alpha) * self.latency
+            self.failures = 0
+            self.down_until = 0.0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.max_failures:
+                self.down_until = time.monotonic() + self.cooldown
+
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+
+class _ThinAnswer(Exception):
+    """A provider answered, but with an empty / partial payload."""
+
+    def __init__(self, problem, result):
+        super().__init__(problem)
+        self.result = result
+
+
+def _check_answer(op, args, result):
+    """What is missing from an answer, or None if it is complete."""
+    if not result:
+        return "empty response"
+    symbols = args[-1]
+    if op == "latest":
+        missing = [s for s in symbols if s not in result]
+        if missing:
+            return f"missing symbols {missing}"
+    return None
+
+
+class ProviderPool:
+    """Query providers in configured order with hedging and failover.
+
+    The first healthy provider is asked; if it has not answered within
+    `hedge_after` seconds the next one is fired as well, and the first
+    complete answer wins. A provider that errors, or answers with an
+    empty / partial payload, triggers the next one immediately. If no
+    provider has a complete answer, the most complete partial one (maybe
+    empty) is returned; only errors count against a provider's health.
+    Unhealthy providers are only tried as a last resort.
+    """
+
+    def __init__(self, providers, hedge_after=2.0, max_failures=3, cooldown=60.0):
+        if not providers:
+            raise ValueError("ProviderPool needs at least one provider.")
+        self.providers = list(providers)
+        self.hedge_after = hedge_after
+        self.health = {
+            p.name: ProviderHealth(max_failures=max_failures, cooldown=cooldown)
+            for p in self.providers
+        }
+
+    def _ranked(self, op):
+        # 健康的源按 config 里的顺序（主 / 备）；延迟不参与排序，否则很快的 file drop
+        # 答过一次 failover 之后就会永远排到 apilayer 前面
+        cands = [p for p in self.providers if op in p.supports]
+        return sorted(cands, key=lambda p: not self.health[p.name].healthy())
+
+    def _timed(self, provider, op, args, logger):
+        health = self.health[provider.name]
+        t0 = time.monotonic()
+        try:
+            result = getattr(provider, op)(*args, logger=logger)
+        except Exception:
+            health.record_failure()
+            raise
+        # 回得了话就算健康；空 / 缺 symbol 只是换下一个源试试，不计入失败
+        health.record_success(time.monotonic() - t0)
+        problem = _check_answer(op, args, result)
+        if problem:
+            raise _ThinAnswer(problem, result)
+        return result
+
+    def call(self, op, *args, logger=None):
+        ranked = self._ranked(op)
+        if not ranked:
+            raise RuntimeError(f"No provider supports '{op}'.")
+
+        executor = ThreadPoolExecutor(max_workers=len(ranked))
+        pending = {}
+        errors = []
+        best = None     # 最完整的空 / 部分答案，所有源都给不出完整答案时用
+        queue = list(ranked)
+
+        def launch():
+            p = queue.pop(0)
+            pending[executor.submit(self._timed, p, op, args, logger)] = p
+
+        launch()
+        try:
+            while pending:
+                timeout = self.hedge_after if queue else None
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                if not done:
+                    slow = next(iter(pending.values()))
+                    usual = self.health[slow.name].latency
+                    usual = f" (usually {usual:.2f}s)" if usual is not None else ""
+                    _log(f"{op}: no answer from {slow.name} in {self.hedge_after}s{usual}"
+                         f" — hedging to {queue[0].name}", logger)
+                    launch()
+                    continue
+
+                for fut in done:
+                    p = pending.pop(fut)
+                    try:
+                        result = fut.result()
+                    except _ThinAnswer as e:
+                        errors.append(f"{p.name}: {e}")
+                        _log(f"{op}: provider {p.name} answered with {e}", logger)
+                        if best is None or len(e.result) > len(best):
+                            best = e.result
+                        continue
+                    except Exception as e:
+                        errors.append(f"{p.name}: {e}")
+                        _log(f"{op}: provider {p.name} failed ({e})", logger)
+                        continue
+                    if len(ranked) > 1:
+                        _log(f"{op}: answered by {p.name}", logger)
+                    return result
+
+                if not pending and queue:
+                    launch()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if best is not None:
+            _log(f"{op}: no complete answer from any provider; using the best partial one", logger)
+            return best
+        raise RuntimeError(f"All providers failed for {op}: " + "; ".join(errors))
+
+    def latest(self, base, symbols, logger=None) -> dict:
+        return self.call("latest", base, symbols, logger=logger)
+
+    def timeseries(self, start_date, end_date, base, symbols, logger=None) -> dict:
+        return self.call("timeseries", start_date, end_date, base, symbols, logger=logger)
+
+
+_POOLS = {}
+
+
+def _build_provider(src: dict, cfg, api_key: str, timeout, timeseries_timeout=None):
+    kind = src.get("type", "apilayer")
+    name = src.get("name", kind)
+
+    if kind in ("apilayer", "http"):
+        return ApilayerProvider(
+            name,
+            src.get("base_url", cfg["api"]["base_url"]),
+            src.get("api_key", api_key),
+            key_header=src.get("key_header", "apikey"),
+            timeout=src.get("timeout", timeout),
+            timeseries_timeout=src.get("timeseries_timeout", timeseries_timeout),
+        )
+    if kind == "file":
+        history = src.get("history_path")
+        return FileDropProvider(
+            name,
+            BASE_DIR / src["path"],
+            history_path=BASE_DIR / history if history else None,
+            max_age=src.get("max_age", 600),
+        )
+    raise ValueError(f"Unknown provider type: {kind}")
+
+
+def get_provider_pool(cfg, api_key: str) -> ProviderPool:
+    """Pool for the configured sources; cached so health survives across calls."""
+    prov_cfg = cfg.get("providers") or {}
+    cache_key = (api_key, json.dumps(prov_cfg, sort_keys=True, default=str))
+    if cache_key in _POOLS:
+        return _POOLS[cache_key]
+
+    timeout = prov_cfg.get("timeout", 120)
+    ts_timeout = prov_cfg.get("timeseries_timeout")
+    sources = prov_cfg.get("sources") or [{"name": "apilayer", "type": "apilayer"}]
+    providers = [_build_provider(src, cfg, api_key, timeout, ts_timeout) for src in sources]
+
+    pool = ProviderPool(
+        providers,
+        hedge_after=float(prov_cfg.get("hedge_after", 2.0)),
+        max_failures=int(prov_cfg.get("max_failures", 3)),
+        cooldown=float(prov_cfg.get("cooldown", 60.0)),
+    )
+    _POOLS[cache_key] = pool
+    return pool
@@ -0,0 +1,204 @@
+"""Tick sanity filter between fetch and storage.
+
+Suspect prices (zero / NaN / inf, stale, spikes) are kept out of
+daily.csv / intraday.csv and appended to data/quarantine.csv instead.
+"""
+import io
+import os
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from common import DATA_DIR, INTRADAY_PATH, ensure_data_dir, _log
+
+QUARANTINE_PATH = DATA_DIR / "quarantine.csv"
+# value = pair price（invert 之后）；raw_rate = API 原始 rate，只有 intraday 有
+QUARANTINE_COLUMNS = ["ts", "source", "pair", "value", "raw_rate", "reason"]
+
+# check() 的返回值：已经报过 stale 的 pair 继续不变 → 不入库，但也不再 quarantine / log
+STILL_STALE = "still_stale"
+
+
+class TickFilter:
+    """Per-pair rolling state for screening new prices before they are stored.
+
+    `check(pair, price)` returns None for a good print (and folds it into the
+    state) or a reason string: "bad_value" (zero / negative / NaN / inf),
+    "stale" (unchanged for `max_stale` ticks in a row) or "spike" (robust
+    z-score of the log return, median/MAD over the last `window` returns,
+    above `z_max`). Work per tick is bounded by `window`, not by history.
+    After `rebase_after` consecutive spikes a pair is re-based on the new
+    level so a genuine jump is not rejected forever. "stale" is returned
+    once when a pair goes stale; later identical prints return STILL_STALE
+    until the price moves again.
+    """
+
+    def __init__(self, pair_names, window=50, z_max=10.0, min_obs=10,
+                 min_scale=5e-4, max_stale=30, rebase_after=2):
+        n = len(pair_names)
+        self._idx = {p: i for i, p in enumerate(pair_names)}
+        self.window = window
+        self.z_max = z_max
+        self.min_obs = min_obs
+        self.min_scale = min_scale
+        self.max_stale = max_stale
+        self.rebase_after = rebase_after
+
+        self.last = np.full(n, np.nan)
+        self.rets = np.full((n, window), np.nan)    # ring buffer of log returns
+        self.count = np.zeros(n, dtype=np.int64)
+        self.stale = np.zeros(n, dtype=np.int64)
+        self.spikes = np.zeros(n, dtype=np.int64)
+
+    @classmethod
+    def from_config(cls, cfg):
+        pair_names = [p["name"] for p in cfg["pairs"]]
+        q = cfg.get("quality") or {}
+        return cls(
+            pair_names,
+            window=int(q.get("window", 50)),
+            z_max=float(q.get("z_max", 10.0)),
+            min_obs=int(q.get("min_obs", 10)),
+            min_scale=float(q.get("min_scale", 5e-4)),
+            max_stale=int(q.get("max_stale", 30)),
+            rebase_after=int(q.get("rebase_after", 2)),
+        )
+
+    def _accept(self, i, price, ret):
+        if ret is not None:
+            self.rets[i, self.count[i] % self.window] = ret
+            self.count[i] += 1
+        self.last[i] = price
+        self.spikes[i] = 0
+
+    def last_good(self, pair):
+        """Last accepted price for `pair` (NaN if none yet)."""
+        i = self._idx.get(pair)
+        return np.nan if i is None else float(self.last[i])
+
+    def seed(self, pair, price):
+        """Fold a known-good historical price into the state without checks."""
+        i = self._idx.get(pair)
+        if i is None or not np.isfinite(price) or price <= 0:
+            return
+        last = self.last[i]
+        ret = np.log(price / last) if np.isfinite(last) else None
+        # 历史里已经不变很久的，留给下一个 live tick 报一次 stale
+        self.stale[i] = min(self.stale[i] + 1, self.max_stale - 1) if ret == 0 else 0
+        self._accept(i, price, ret)
+
+    def check(self, pair, price):
+        i = self._idx.get(pair)
+        if i is None:
+            return None
+        if not np.isfinite(price) or price <= 0:
+            return "bad_value"
+
+        last = self.last[i]
+        if not np.isfinite(last):
+            self._accept(i, price, None)
+            return None
+
+        ret = np.log(price / last)
+        if ret == 0:
+            self.stale[i] += 1
+            if self.stale[i] == self.max_stale:
+                return "stale"
+            if self.stale[i] > self.max_stale:
+                return STILL_STALE
+            self._accept(i, price, ret)
+            return None
+
+        n_obs = min(self.count[i], self.window)
+        if n_obs >= self.min_obs:
+            buf = self.rets[i, :n_obs]
+            med = np.median(buf)
+            mad = 1.4826 * np.median(np.abs(buf - med))
+            z = abs(ret - med) / max(mad, self.min_scale)
+            if z > self.z_max:
+                self.spikes[i] += 1
+                if self.spikes[i] < self.rebase_after:
+                    return "spike"
+
+        self.stale[i] = 0
+        self._accept(i, price, ret)
+        return None
+
+
+_TICK_FILTERS = {}
+
+
+def _read_csv_tail(path: Path, n_rows: int) -> pd.DataFrame:
+    """Last `n_rows` rows of a CSV without reading the whole file."""
+    with open(path, "rb") as f:
+        header = f.readline()
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        pos, data = end, b""
+        while pos > len(header) and data.count(b"\n") <= n_rows:
+            step = min(1 << 16, pos - len(header))
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+
+    lines = data.splitlines()[-n_rows:] if pos > len(header) else data.splitlines()
+    body = b"\n".join(line for line in lines if line.strip())
+    if not body:
+        return pd.DataFrame()
+    return pd.read_csv(io.BytesIO(header + body))
+
+
+def get_intraday_filter(cfg) -> TickFilter:
+    """Process-wide intraday filter, seeded from the tail of intraday.csv once."""
+    pair_names = [p["name"] for p in cfg["pairs"]]
+    key = ("intraday", tuple(pair_names), json.dumps(cfg.get("quality") or {}, sort_keys=True))
+    if key in _TICK_FILTERS:
+        return _TICK_FILTERS[key]
+
+    tf = TickFilter.from_config(cfg)
+    if INTRADAY_PATH.exists():
+        tail = _read_csv_tail(INTRADAY_PATH, (tf.window + 1) * len(pair_names))
+        if {"pair", "price"}.issubset(tail.columns):
+            for pair, price in zip(tail["pair"], pd.to_numeric(tail["price"], errors="coerce")):
+                tf.seed(pair, price)
+    _TICK_FILTERS[key] = tf
+    return tf
+
+
+def quarantine(rows: list, logger=None):
+    """Append rejected values to quarantine.csv and report them."""
+    if not rows:
+        return
+    ensure_data_dir()
+    df_q = pd.DataFrame(rows, columns=QUARANTINE_COLUMNS)
+    df_q.to_csv(QUARANTINE_PATH, mode="a", index=False, header=not QUARANTINE_PATH.exists())
+
+    counts = df_q.groupby("reason").size().to_dict()
+    _log(f"Quality: quarantined {len(df_q)} value(s) {counts} → {QUARANTINE_PATH.name}", logger)
+    for r in rows[:10]:
+        _log(f"  {r['source']} {r['ts']} {r['pair']} = {r['value']} ({r['reason']})", logger)
+
+
+def screen_pair_frame(df: pd.DataFrame, tf: TickFilter, source: str, logger=None) -> pd.DataFrame:
+    """Date × pair frame with suspect values quarantined.
+
+    A rejected cell keeps the pair's last good price instead of a NaN, so
+    one bad fixing does not blank every rolling RV window that spans it.
+    """
+    out = df.copy()
+    rejected = []
+    for ts, row in df.iterrows():
+        for pair, price in row.items():
+            if pd.isna(price):
+                continue
+            reason = tf.check(pair, float(price))
+            if reason is not None:
+                out.at[ts, pair] = tf.last_good(pair)
+                if reason == STILL_STALE:
+                    continue
+                rejected.append({"ts": str(ts), "source": source, "pair": pair,
+                                 "value": price, "reason": reason})
+    quarantine(rejected, logger)
+    return out
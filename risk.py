@@ -0,0 +1,139 @@
+"""Historical-simulation / parametric VaR and stress tests on daily returns.
+
+Positions file (CSV): `pair,notional[,book]` — notional is the USD
+exposure to the pair's price; several rows per pair/book are summed.
+Every scenario set is one matrix product against the notional matrix
+W (pairs × books):
+
+    historical P&L  = expm1(R) @ W      R: days × pairs log returns
+    parametric VaR  = z · sqrt(diag(Wᵀ Σ W))
+    stress P&L      = S @ W             S: scenarios × pairs shocks
+
+    python main.py --action risk --positions data/positions.csv --confidence 0.95,0.99
+"""
+from datetime import datetime, timedelta
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import main as backend
+
+TOTAL = "TOTAL"
+
+
+def load_positions(path, pair_names, logger=None) -> pd.DataFrame:
+    """Notional matrix: index = configured pairs, columns = books (+ TOTAL)."""
+    pos = pd.read_csv(path)
+    if not {"pair", "notional"}.issubset(pos.columns):
+        raise ValueError("positions file needs 'pair' and 'notional' columns.")
+
+    if "book" not in pos.columns:
+        pos["book"] = "book"
+    pos["notional"] = pd.to_numeric(pos["notional"], errors="coerce").fillna(0.0)
+
+    unknown = sorted(set(pos["pair"]) - set(pair_names))
+    if unknown:
+        backend._log(f"Risk: ignoring positions in unknown pairs {unknown}", logger)
+        pos = pos[pos["pair"].isin(pair_names)]
+
+    W = pos.pivot_table(index="pair", columns="book", values="notional", aggfunc="sum", fill_value=0.0)
+    W = W.reindex(index=pair_names, fill_value=0.0)
+    if W.shape[1] > 1:
+        W[TOTAL] = W.sum(axis=1)
+    return W
+
+
+def stress_matrix(cfg, pair_names) -> pd.DataFrame:
+    """scenarios × pairs of fractional moves from config.yaml `risk.stress`."""
+    scen = (cfg.get("risk") or {}).get("stress") or {}
+    S = pd.DataFrame(0.0, index=list(scen), columns=pair_names)
+    for name, shocks in scen.items():
+        for pair, pct in (shocks or {}).items():
+            if pair in S.columns:
+                S.loc[name, pair] = float(pct) / 100.0
+    return S
+
+
+def var_table(R: np.ndarray, W: np.ndarray, books, confidence) -> pd.DataFrame:
+    """Historical VaR/ES and covariance VaR per book for each confidence level."""
+    simple = np.expm1(R)
+    pnl = simple @ W                          # days × books
+    pnl_sorted = np.sort(pnl, axis=0)
+    tail_sum = np.cumsum(pnl_sorted, axis=0)
+
+    cov = np.cov(simple, rowvar=False)        # pairs × pairs
+    sigma = np.sqrt(np.maximum(np.einsum("ib,ij,jb->b", W, cov, W), 0.0))
+
+    n = pnl.shape[0]
+    out = {}
+    for c in confidence:
+        k = max(1, int(np.ceil((1 - c) * n)))
+        tag = f"{c * 100:g}"
+        out[f"hist_var_{tag}"] = -pnl_sorted[k - 1]
+        out[f"hist_es_{tag}"] = -tail_sum[k - 1] / k
+        out[f"param_var_{tag}"] = NormalDist().inv_cdf(c) * sigma
+    return pd.DataFrame(out, index=books)
+
+
+def run_risk(positions_path, confidence=(0.95, 0.99), years=None, logger=None) -> dict:
+    """VaR table (books × measures) and stress table (books × scenarios)."""
+    confidence = [float(c) for c in confidence]
+    bad = [c for c in confidence if not 0 < c < 1]
+    if not confidence or bad:
+        raise ValueError(
+            f"Confidence levels must be fractions strictly between 0 and 1 (e.g. 0.95,0.99); got {bad or 'none'}."
+        )
+
+    cfg = backend.load_config()
+    pair_names, _ = backend._get_pairs_and_symbols(cfg)
+    risk_cfg = cfg.get("risk") or {}
+
+    W = load_positions(positions_path, pair_names, logger)
+
+    years = years or risk_cfg.get("years_back", cfg["history"].get("years_back", 5))
+    start = datetime.utcnow().date() - timedelta(days=int(years * 365))
+    px = backend.get_history(pair_names, start=start)
+    if px is None or len(px) < 2:
+        raise RuntimeError("Need daily.csv history first.")
+
+    # 缺的 fixing 沿用前一天，缺口两边不会多出一个 0 return 和一个大跳
+    px = px.reindex(columns=pair_names).ffill()
+    held = [p for p in pair_names if (W.loc[p] != 0).any()]
+    no_hist = [p for p in held if px[p].count() < 2]
+    if no_hist:
+        raise ValueError(f"No usable daily history for pairs with positions: {no_hist}")
+
+    # 只用所有持仓 pair 都有 return 的日子；没持仓的 pair 权重为 0，NaN 填 0 不影响结果
+    rets = backend.compute_log_returns(px)
+    usable = rets[held].notna().all(axis=1)
+    if not usable.all():
+        backend._log(f"Risk: {int((~usable).sum())} day(s) before the shortest held history skipped", logger)
+    rets = rets[usable]
+    if len(rets) < 2:
+        raise RuntimeError("Not enough overlapping history for the held pairs.")
+    R = rets.fillna(0.0).to_numpy(np.float64)
+
+    books = list(W.columns)
+    Wm = W.to_numpy(np.float64)
+
+    var = var_table(R, Wm, books, confidence)
+    S = stress_matrix(cfg, pair_names)
+    stress = pd.DataFrame(S.to_numpy() @ Wm, index=S.index, columns=books).T
+
+    backend._log(
+        f"Risk: {len(books)} book(s), {int((Wm != 0).sum())} pair exposures, "
+        f"{len(R)} days, {len(S)} stress scenarios",
+        logger,
+    )
+    return {"var": var, "stress": stress}
+
+
+def format_report(result: dict) -> str:
+    lines = ["== VaR / ES (1 day) =="]
+    lines.append(result["var"].round(0).to_string())
+    if not result["stress"].empty:
+        lines.append("")
+        lines.append("== Stress P&L ==")
+        lines.append(result["stress"].round(0).to_string())
+    return "\n".join(lines)
@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# 模块都在仓库根目录（flat layout）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Point every data/ path at a temp dir so tests never touch the real CSVs."""
+    import common
+    import main
+    import quality
+
+    paths = {
+        "DATA_DIR": tmp_path,
+        "DAILY_PATH": tmp_path / "daily.csv",
+        "INTRADAY_PATH": tmp_path / "intraday.csv",
+        "VOL_PATH": tmp_path / "volatility.csv",
+    }
+    for name, path in paths.items():
+        monkeypatch.setattr(common, name, path)
+        monkeypatch.setattr(main, name, path)
+    monkeypatch.setattr(main, "INDEX_DIR", tmp_path / "index")
+    monkeypatch.setitem(main._STORES, "daily", paths["DAILY_PATH"])
+    monkeypatch.setitem(main._STORES, "vol", paths["VOL_PATH"])
+    monkeypatch.setattr(main, "_INDEX_CACHE", {})
+    monkeypatch.setattr(quality, "QUARANTINE_PATH", tmp_path / "quarantine.csv")
+    monkeypatch.setattr(quality, "INTRADAY_PATH", paths["INTRADAY_PATH"])
+    return tmp_path
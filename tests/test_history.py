@@ -0,0 +1,93 @@
+"""get_history over the on-disk index, and how index versions are published."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+PAIRS = ["EURUSD", "USDJPY"]
+
+
+@pytest.fixture
+def daily(data_dir):
+    idx = pd.bdate_range("2023-01-02", periods=300, name="date")
+    df = pd.DataFrame({"EURUSD": np.linspace(1.0, 1.3, len(idx)),
+                       "USDJPY": np.linspace(130.0, 150.0, len(idx))}, index=idx)
+    df.to_csv(main.DAILY_PATH)
+    main.compute_volatility(df=df)
+    return df
+
+
+def _versions(name):
+    return sorted(p.name for p in main.INDEX_DIR.iterdir() if p.name.startswith(f"{name}-"))
+
+
+def test_no_csv_returns_none(data_dir):
+    assert main.get_history(PAIRS) is None
+
+
+def test_range_is_inclusive_and_last_trims_the_tail(daily):
+    px = main.get_history(PAIRS, start="2023-03-01", end="2023-03-31")
+    assert list(px.columns) == PAIRS
+    assert px.index[0] == pd.Timestamp("2023-03-01")
+    assert px.index[-1] == pd.Timestamp("2023-03-31")
+    pd.testing.assert_frame_equal(px, daily.loc["2023-03-01":"2023-03-31"],
+                                  check_freq=False, check_index_type=False, check_names=False)
+
+    tail = main.get_history("USDJPY", end="2023-03-31", last=5)
+    assert list(tail.index) == list(daily.loc[:"2023-03-31"].index[-5:])
+    assert list(tail.columns) == ["USDJPY"]
+
+    assert len(main.get_history(PAIRS, start="2030-01-01")) == 0
+
+
+def test_field_list_mixes_price_and_vol(daily):
+    df = main.get_history(PAIRS, fields=["price", "rv_30"], last=3)
+    assert set(df.columns.get_level_values("field")) == {"price", "rv_30"}
+    assert df[("price", "EURUSD")].iloc[-1] == pytest.approx(daily["EURUSD"].iloc[-1])
+    assert df["rv_30"].notna().all().all()
+
+
+def test_csv_change_publishes_a_new_version_and_drops_the_old(daily):
+    main.get_history(PAIRS, last=1)
+    before = _versions("daily")
+    assert len(before) == 1
+
+    extra = daily.iloc[[-1]].copy()
+    extra.index = [daily.index[-1] + pd.offsets.BDay()]
+    extra.index.name = "date"
+    pd.concat([daily, extra * 1.01]).to_csv(main.DAILY_PATH)
+
+    assert main.get_history("EURUSD", last=1).iloc[-1, 0] == pytest.approx(1.3 * 1.01)
+    after = _versions("daily")
+    assert len(after) == 1 and after != before
+
+
+def test_losing_the_publish_race_keeps_the_winner(daily):
+    stamp = main._source_stamp(main.DAILY_PATH)
+    dates = np.arange(3, dtype=np.int64)
+    main._write_store("daily", dates, np.zeros((2, 1, 3)), PAIRS, ["price"], stamp)
+    main._write_store("daily", dates, np.ones((2, 1, 3)), PAIRS, ["price"], stamp)
+
+    assert _versions("daily") == [main._store_dir("daily", stamp).name]
+    assert [p for p in main.INDEX_DIR.iterdir() if p.name.startswith(".")] == []
+    values = np.load(main._store_dir("daily", stamp) / "values.npy")
+    assert (values == 0).all()
+
+
+def test_open_retries_when_the_csv_changes_mid_build(daily, monkeypatch):
+    build = main._BUILDERS["daily"]
+
+    def touch_then_build():
+        st = os.stat(main.DAILY_PATH)
+        os.utime(main.DAILY_PATH, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+        build()
+
+    monkeypatch.setitem(main._BUILDERS, "daily", touch_then_build)
+    px = main.get_history(PAIRS, last=2)
+
+    assert len(px) == 2
+    meta = main._INDEX_CACHE["daily"][0]
+    assert meta["source"] == main._source_stamp(main.DAILY_PATH)
@@ -0,0 +1,149 @@
+"""Hedging / failover of ProviderPool against local stand-in HTTP servers."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from providers import ApilayerProvider, ProviderPool
+
+SYMBOLS = ["EUR", "JPY"]
+RATES = {"EUR": 0.92, "JPY": 150.0}
+
+
+def _stand_in(body=None, status=200, delay=0.0):
+    """apilayer-shaped server on a free port; returns (server, base_url, hits)."""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            time.sleep(delay)
+            payload = json.dumps(body if body is not None else {"rates": RATES}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}", hits
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(**kw):
+        server, url, hits = _stand_in(**kw)
+        started.append(server)
+        return url, hits
+
+    yield start
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+def _pool(*urls, hedge_after=5.0):
+    providers = [
+        ApilayerProvider(f"src{i}", url, "KEY", timeout=5) for i, url in enumerate(urls)
+    ]
+    return ProviderPool(providers, hedge_after=hedge_after)
+
+
+def test_hedges_to_backup_when_primary_is_slow(servers):
+    slow, slow_hits = servers(delay=2.0)
+    fast, fast_hits = servers(body={"rates": {"EUR": 0.93, "JPY": 151.0}})
+    pool = _pool(slow, fast, hedge_after=0.2)
+
+    t0 = time.monotonic()
+    rates = pool.latest("USD", SYMBOLS)
+
+    assert rates == {"EUR": 0.93, "JPY": 151.0}
+    assert time.monotonic() - t0 < 1.5
+    assert len(slow_hits) == 1 and len(fast_hits) == 1
+
+
+def test_fails_over_on_http_error(servers):
+    broken, _ = servers(body={"error": "down"}, status=500)
+    backup, backup_hits = servers()
+    pool = _pool(broken, backup)
+
+    assert pool.latest("USD", SYMBOLS) == RATES
+    assert len(backup_hits) == 1
+    assert pool.health["src0"].failures == 1
+    assert pool.health["src1"].failures == 0
+
+
+@pytest.mark.parametrize("body", [{"rates": {}}, {"rates": {"EUR": 0.92}}, {}])
+def test_fails_over_on_empty_or_partial_latest(servers, body):
+    bad, _ = servers(body=body)
+    backup, backup_hits = servers()
+    pool = _pool(bad, backup)
+
+    assert pool.latest("USD", SYMBOLS) == RATES
+    assert len(backup_hits) == 1
+    assert pool.health["src0"].failures == 0    # answered, just not completely
+
+
+def test_empty_timeseries_from_every_source_returns_empty(servers):
+    a, _ = servers(body={"rates": {}})
+    b, _ = servers(body={"rates": {}})
+    pool = _pool(a, b)
+
+    assert pool.timeseries("2024-01-06", "2024-01-07", "USD", SYMBOLS) == {}
+    for name in ("src0", "src1"):
+        assert pool.health[name].failures == 0
+        assert pool.health[name].healthy()
+
+
+def test_symbol_missing_everywhere_returns_best_partial(servers):
+    thin, _ = servers(body={"rates": {}})
+    partial, _ = servers(body={"rates": {"EUR": 0.92}})
+    pool = _pool(thin, partial)
+
+    for _ in range(5):      # more polls than max_failures
+        assert pool.latest("USD", SYMBOLS) == {"EUR": 0.92}
+    assert pool.health["src0"].failures == 0
+    assert pool.health["src1"].failures == 0
+    assert pool.health["src1"].healthy()
+
+
+def test_error_plus_empty_returns_empty_and_counts_only_the_error(servers):
+    broken, _ = servers(body={"error": "down"}, status=500)
+    empty, _ = servers(body={"rates": {}})
+    pool = _pool(broken, empty)
+
+    assert pool.timeseries("2024-01-06", "2024-01-07", "USD", SYMBOLS) == {}
+    assert pool.health["src0"].failures == 1
+    assert pool.health["src1"].failures == 0
+
+
+def test_every_source_erroring_raises(servers):
+    a, _ = servers(body={"error": "down"}, status=500)
+    b, _ = servers(body={"error": "down"}, status=503)
+    pool = _pool(a, b)
+
+    with pytest.raises(RuntimeError, match="All providers failed"):
+        pool.latest("USD", SYMBOLS)
+
+
+def test_primary_stays_first_after_a_faster_backup_answers(servers):
+    primary, primary_hits = servers(delay=0.05)
+    backup, backup_hits = servers()
+    pool = _pool(primary, backup)
+    pool.health["src0"].record_success(0.5)     # e.g. after the backup served a failover
+    pool.health["src1"].record_success(0.001)   # a local file drop answers in microseconds
+
+    pool.latest("USD", SYMBOLS)
+    pool.latest("USD", SYMBOLS)
+
+    assert len(primary_hits) == 2
+    assert backup_hits == []
@@ -0,0 +1,89 @@
+"""TickFilter screening and what a quarantined daily fixing leaves behind."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from quality import STILL_STALE, TickFilter, screen_pair_frame
+
+
+def _random_walk(n, pairs, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range("2022-01-03", periods=n, name="date")
+    steps = rng.normal(0, 0.004, size=(n, len(pairs)))
+    return pd.DataFrame(np.exp(np.cumsum(steps, axis=0)) * 100, index=idx, columns=pairs)
+
+
+def _warmed_filter(**kw):
+    tf = TickFilter(["EURUSD"], **kw)
+    rng = np.random.default_rng(3)
+    for price in 1.10 * np.exp(np.cumsum(rng.normal(0, 1e-3, 60))):
+        assert tf.check("EURUSD", price) is None
+    return tf
+
+
+@pytest.mark.parametrize("price", [0.0, -1.2, np.nan, np.inf])
+def test_bad_values_are_rejected_and_not_folded_in(price):
+    tf = _warmed_filter()
+    last = tf.last_good("EURUSD")
+    assert tf.check("EURUSD", price) == "bad_value"
+    assert tf.last_good("EURUSD") == last
+
+
+def test_unknown_pair_passes():
+    assert TickFilter(["EURUSD"]).check("USDJPY", 0.0) is None
+
+
+def test_stale_is_reported_once_then_quiet_until_the_price_moves():
+    tf = _warmed_filter(max_stale=3)
+    px = tf.last_good("EURUSD")
+
+    seen = [tf.check("EURUSD", px) for _ in range(6)]
+    assert seen == [None, None, "stale", STILL_STALE, STILL_STALE, STILL_STALE]
+
+    assert tf.check("EURUSD", px * 1.0001) is None
+    assert [tf.check("EURUSD", px * 1.0001) for _ in range(3)] == [None, None, "stale"]
+
+
+def test_seeded_flat_history_reports_stale_on_the_next_live_tick():
+    tf = TickFilter(["EURUSD"], max_stale=3)
+    for _ in range(10):
+        tf.seed("EURUSD", 1.1)
+    assert [tf.check("EURUSD", 1.1) for _ in range(2)] == ["stale", STILL_STALE]
+
+
+def test_spike_is_rejected_then_rebased_after_repeats():
+    tf = _warmed_filter(rebase_after=2)
+    px = tf.last_good("EURUSD")
+
+    assert tf.check("EURUSD", px * 1.2) == "spike"
+    assert tf.last_good("EURUSD") == px
+    assert tf.check("EURUSD", px * 1.2) is None          # second in a row → new level
+    assert tf.last_good("EURUSD") == px * 1.2
+    assert tf.check("EURUSD", px * 1.2001) is None
+
+
+def test_a_single_spike_does_not_rebase():
+    tf = _warmed_filter(rebase_after=2)
+    px = tf.last_good("EURUSD")
+
+    assert tf.check("EURUSD", px * 1.2) == "spike"
+    assert tf.check("EURUSD", px * 1.0005) is None
+    assert tf.check("EURUSD", px * 1.2) == "spike"       # counter reset by the good print
+
+
+def test_one_quarantined_fixing_does_not_wipe_out_rv(data_dir):
+    df = _random_walk(600, ["USDJPY", "EURUSD"])
+    bad_day = df.index[400]
+    df.loc[bad_day, "USDJPY"] *= 1.5                     # fat-finger fixing
+
+    screened = screen_pair_frame(df, TickFilter(["USDJPY", "EURUSD"]), "daily")
+    assert screened.loc[bad_day, "USDJPY"] == df["USDJPY"].iloc[399]
+    assert screened.notna().all().all()
+    assert (data_dir / "quarantine.csv").exists()
+
+    vol = main.compute_volatility(df=screened)
+    jpy = vol[vol["pair"] == "USDJPY"].set_index("date")
+    after = jpy.loc[jpy.index > bad_day.strftime("%Y-%m-%d")]
+    for w in (30, 60, 90, 180, 250):
+        assert after[f"rv_{w}"].notna().all(), f"rv_{w} has gaps after the quarantined day"
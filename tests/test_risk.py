@@ -0,0 +1,45 @@
+"""VaR inputs: gaps in daily history must not turn into zero-P&L days."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import risk
+
+
+def _write_daily(data_dir, df):
+    df.to_csv(data_dir / "daily.csv")
+
+
+def _prices(n=300, seed=1):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=n, name="date")
+    steps = rng.normal(0, 0.006, size=(n, 2))
+    return pd.DataFrame(np.exp(np.cumsum(steps, axis=0)) * [150.0, 1.1],
+                        index=idx, columns=["USDJPY", "EURUSD"])
+
+
+def test_gap_in_held_pair_matches_forward_filled_history(data_dir):
+    df = _prices()
+    (data_dir / "pos.csv").write_text("pair,notional\nUSDJPY,1000000\n")
+
+    filled = df.copy()
+    filled.iloc[100:110, 0] = filled.iloc[99, 0]
+    _write_daily(data_dir, filled)
+    expected = risk.run_risk(data_dir / "pos.csv", years=2)["var"]
+
+    gappy = df.copy()
+    gappy.iloc[100:110, 0] = np.nan
+    _write_daily(data_dir, gappy)
+    got = risk.run_risk(data_dir / "pos.csv", years=2)["var"]
+
+    pd.testing.assert_frame_equal(got, expected)
+
+
+def test_held_pair_without_history_raises(data_dir):
+    df = _prices()
+    df["USDJPY"] = np.nan
+    _write_daily(data_dir, df)
+    (data_dir / "pos.csv").write_text("pair,notional\nUSDJPY,1000000\nEURUSD,500000\n")
+
+    with pytest.raises(ValueError, match="USDJPY"):
+        risk.run_risk(data_dir / "pos.csv", years=2)
@@ -0,0 +1,72 @@
+"""TickStore.refresh: incremental reads, partial lines, truncation and rotation."""
+import os
+
+import pytest
+
+from ticks import TickStore
+
+HEADER = "ts,pair,price\n"
+
+
+def _row(minute, pair, price):
+    return f"2024-01-02T10:{minute:02d}:00,{pair},{price}\n"
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "intraday.csv"
+
+
+def _latest(store):
+    return store.latest()["price"].to_dict()
+
+
+def test_only_appended_complete_lines_are_parsed(path):
+    path.write_text(HEADER + _row(0, "EURUSD", 1.1) + _row(0, "USDJPY", 150.0))
+    store = TickStore(["EURUSD", "USDJPY"])
+    store.refresh(path)
+    assert len(store) == 2
+
+    with open(path, "a") as f:
+        f.write(_row(1, "EURUSD", 1.2) + "2024-01-02T10:02:00,USD")   # half-written row
+    store.refresh(path)
+    assert len(store) == 3
+    assert _latest(store)["EURUSD"] == 1.2
+
+    with open(path, "a") as f:
+        f.write("JPY,151.0\n")
+    store.refresh(path)
+    assert len(store) == 4
+    assert _latest(store)["USDJPY"] == 151.0
+
+
+def test_truncated_file_resets_the_store(path):
+    path.write_text(HEADER + "".join(_row(m, "EURUSD", 1.1 + m / 100) for m in range(10)))
+    store = TickStore(["EURUSD", "USDJPY"])
+    store.refresh(path)
+    assert len(store) == 10
+
+    path.write_text(HEADER + _row(30, "USDJPY", 149.0))
+    store.refresh(path)
+    assert len(store) == 1
+    assert _latest(store) == {"USDJPY": 149.0}
+
+
+def test_replaced_file_resets_even_when_it_is_longer(path, tmp_path):
+    path.write_text(HEADER + _row(0, "EURUSD", 1.1))
+    store = TickStore(["EURUSD", "USDJPY"])
+    store.refresh(path)
+
+    new = tmp_path / "intraday.new"
+    new.write_text(HEADER + "".join(_row(m, "USDJPY", 150.0 + m) for m in range(5)))
+    os.replace(new, path)
+    store.refresh(path)
+
+    assert len(store) == 5
+    assert _latest(store) == {"USDJPY": 154.0}
+
+
+def test_bad_header_raises(path):
+    path.write_text("time,symbol,px\n")
+    with pytest.raises(ValueError):
+        TickStore(["EURUSD"]).refresh(path)
@@ -0,0 +1,152 @@
+"""Compact resident intraday tick store and memory budget report."""
+import io
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from common import INTRADAY_PATH, _log
+
+
+class TickStore:
+    """Intraday ticks held as typed columns instead of a long object frame.
+
+    ts: int64 epoch seconds, code: int16 index into `pair_names`,
+    price: float64 (float32 would show noise in the 6th decimal of JPY /
+    metal quotes). `refresh()` only parses bytes appended to intraday.csv
+    since the last call; `latest()` is O(pairs) via a per-pair last-row index.
+    """
+
+    COLUMNS = ["ts", "pair", "price"]
+
+    def __init__(self, pair_names, capacity=4096):
+        self.pair_names = list(pair_names)
+        self._dtype = pd.CategoricalDtype(self.pair_names)
+        self.ts = np.empty(capacity, dtype=np.int64)
+        self.code = np.empty(capacity, dtype=np.int16)
+        self.price = np.empty(capacity, dtype=np.float64)
+        self.n = 0
+        self.last_idx = np.full(len(self.pair_names), -1, dtype=np.int64)
+        self._offset = 0
+        self._header = None
+        self._inode = None
+
+    def clear(self):
+        """Drop every row and forget the file position (keeps the buffers)."""
+        self.n = 0
+        self.last_idx[:] = -1
+        self._offset = 0
+        self._header = None
+        self._inode = None
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def nbytes(self) -> int:
+        return self.ts.nbytes + self.code.nbytes + self.price.nbytes + self.last_idx.nbytes
+
+    def _grow(self, need: int):
+        cap = len(self.ts)
+        if self.n + need <= cap:
+            return
+        new_cap = max(cap * 2, self.n + need)
+        for name in ("ts", "code", "price"):
+            old = getattr(self, name)
+            arr = np.empty(new_cap, dtype=old.dtype)
+            arr[:self.n] = old[:self.n]
+            setattr(self, name, arr)
+
+    def append_frame(self, df: pd.DataFrame):
+        """Append rows of a (ts, pair, price) frame; unknown pairs / bad ts dropped."""
+        if df.empty:
+            return
+        codes = df["pair"].astype(self._dtype).cat.codes.to_numpy()
+        ts = pd.to_datetime(df["ts"], errors="coerce")
+        ok = (codes >= 0) & ts.notna().to_numpy()
+        if not ok.any():
+            return
+
+        k = int(ok.sum())
+        self._grow(k)
+        sl = slice(self.n, self.n + k)
+        self.ts[sl] = ts[ok].to_numpy().astype("datetime64[s]").astype(np.int64)
+        self.code[sl] = codes[ok]
+        self.price[sl] = pd.to_numeric(df["price"], errors="coerce").to_numpy(np.float64)[ok]
+
+        rows = np.arange(self.n, self.n + k)
+        self.last_idx[self.code[sl]] = rows   # 同一 pair 多行时保留最后一行
+        self.n += k
+
+    def refresh(self, path: Path = INTRADAY_PATH):
+        """Parse only what was appended to `path` since the last refresh.
+
+        If the file was truncated or replaced (shorter than what was already
+        read, or a different inode), the store starts over from the header.
+        """
+        if not path.exists():
+            return
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if self._header is not None and (st.st_ino != self._inode or st.st_size < self._offset):
+                self.clear()
+            if self._header is None:
+                header = f.readline()
+                cols = header.decode("utf-8").strip().split(",")
+                if not set(self.COLUMNS).issubset(cols):
+                    raise ValueError("intraday.csv missing required columns.")
+                self._header = cols
+                self._offset = len(header)
+                self._inode = st.st_ino
+            f.seek(self._offset)
+            data = f.read()
+
+        end = data.rfind(b"\n") + 1     # 只处理完整的行
+        if end <= 0:
+            return
+        self._offset += end
+        self.append_frame(pd.read_csv(io.BytesIO(data[:end]), header=None, names=self._header))
+
+    def latest(self) -> pd.DataFrame:
+        """Last tick per pair, indexed by pair (ts as datetime, price)."""
+        have = self.last_idx >= 0
+        idx = self.last_idx[have]
+        return pd.DataFrame(
+            {
+                "ts": pd.to_datetime(self.ts[idx], unit="s"),
+                "price": self.price[idx],
+            },
+            index=pd.Index(np.array(self.pair_names)[have], name="pair"),
+        )
+
+
+def memory_report(tick_store: TickStore = None, mapped=None, logger=None) -> pd.DataFrame:
+    """Measured footprint of the resident structures (bytes) + process peak RSS.
+
+    `mapped` is {label: (dates, values)}, e.g. `main.mapped_history()`.
+    """
+    rows = []
+    if tick_store is not None:
+        rows.append({"structure": "intraday ticks (resident)", "rows": len(tick_store),
+                     "bytes": tick_store.nbytes})
+    for label, (dates, values) in (mapped or {}).items():
+        rows.append({"structure": label, "rows": len(dates),
+                     "bytes": dates.nbytes + values.nbytes})
+
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位是 KB，macOS 是 bytes
+        rss = rss if sys.platform == "darwin" else rss * 1024
+        rows.append({"structure": "process peak RSS", "rows": None, "bytes": rss})
+    except ImportError:
+        pass
+
+    df = pd.DataFrame(rows, columns=["structure", "rows", "bytes"])
+    df["MB"] = (df["bytes"] / 2**20).round(2)
+    for r in df.itertuples():
+        rows_txt = f"{int(r.rows):>10,} rows" if pd.notna(r.rows) else " " * 15
+        _log(f"Memory: {r.structure:<28} {rows_txt}  {r.MB:>9.2f} MB", logger)
+    return df